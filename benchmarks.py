@@ -0,0 +1,306 @@
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+
+from engine import SHAPES, Engine
+from simulate import play_game
+
+SIZES = ((10, 20), (20, 40), (50, 100), (100, 200))  # Board sizes as (width, height)
+FILL_LEVELS = (0.0, 0.25, 0.5, 0.75)  # The fractions of rows filled with blocks
+BLOCK_DENSITY = 0.7  # The chance that a tile in a filled row holds a block
+FULL_ROW_INTERVAL = 3  # Every this many filled rows is full in cascade benchmarks
+NUMBER = 200  # The most calls timed in each run of a benchmark
+RUN_SECONDS = 0.05  # Runs of slow benchmarks make as many calls as fit in this
+REPEAT = 5  # The number of runs of each benchmark, of which the fastest is kept
+THROUGHPUT_GAMES = 5  # The number of games played to measure pieces per second
+THROUGHPUT_TICKS = 5000  # The number of ticks after which those games are stopped
+THRESHOLD = 0.1  # How much worse than the baseline a result may get, as a fraction
+HIGHER_IS_BETTER = {"pieces/s"}  # The units of results where more is better
+
+
+def fill_board(
+    engine: Engine, fill: float, rng: random.Random, full_interval: int = 0
+) -> None:
+    """
+    Fills the lowest fill fraction of the rows of the engine's board with
+    random blocks. Each row is left with at least one empty tile, except that
+    every full_interval-th row is filled completely if full_interval is given.
+    """
+    board = engine.board
+    for i in range(round(fill * board.height)):
+        y = board.height - 1 - i
+        full = full_interval and i % full_interval == full_interval - 1
+        hole = rng.randrange(board.width)
+        for x in range(board.width):
+            if full or (x != hole and rng.random() < BLOCK_DENSITY):
+                board.place(x, y, rng.randrange(len(SHAPES)))
+
+
+def make_engine(
+    width: int,
+    height: int,
+    fill: float,
+    seed: int,
+    shape: int | None = None,
+    full_interval: int = 0,
+    instant_cascades: bool = False,
+) -> Engine:
+    """
+    Returns an engine with a synthetic board filled by fill_board. If a shape
+    is given it is spawned and left moving, otherwise the engine is about to
+    delete the full rows of its board.
+    """
+    engine = Engine(width, height, seed=seed, instant_cascades=instant_cascades)
+    fill_board(engine, fill, random.Random(seed), full_interval)
+    if shape is None:
+        engine.state_machine.set_state("clearing_rows")
+    else:
+        engine.shape_queue[0] = shape
+        engine.state_machine.set_state("spawn_shape")
+        engine.tick()
+    return engine
+
+
+def moving_engines(width: int, height: int, fill: float) -> list[Engine]:
+    """
+    Returns one engine per shape, each with that shape just spawned.
+    """
+    return [
+        make_engine(width, height, fill, seed, shape)
+        for seed, shape in enumerate(range(len(SHAPES)))
+    ]
+
+
+def walled_engines(width: int, height: int, fill: float) -> list[Engine]:
+    """
+    Returns an engine for every shape in every orientation, pushed against
+    the left or right wall, so that rotating them often needs a kick.
+    """
+    engines = []
+    for engine in moving_engines(width, height, fill):
+        for turns in range(4):
+            for move in (Engine.move_shape_left, Engine.move_shape_right):
+                walled = engine.clone()
+                for _ in range(turns):
+                    walled.rotate()
+                for _ in range(width):
+                    move(walled)
+                engines.append(walled)
+    return engines
+
+
+def time_calls(prepare, call, repeat: int = REPEAT) -> float:
+    """
+    Returns the fewest seconds per call out of repeat runs of call on
+    arguments made by prepare, which is not timed. One call is timed first
+    to choose how many calls to make in each run, at most NUMBER.
+    """
+    best = float("inf")
+    number = 1
+    for _ in range(repeat + 1):
+        arguments = [prepare() for _ in range(number)]
+        start = time.perf_counter()
+        for argument in arguments:
+            call(argument)
+        best = min(best, (time.perf_counter() - start) / number)
+        number = max(1, min(NUMBER, int(RUN_SECONDS / best)))
+    return best
+
+
+def reuse(engines: list[Engine]):
+    """
+    Returns a prepare function for time_calls that hands out the engines in
+    turn, for calls that do not change them.
+    """
+    return itertools.cycle(engines).__next__
+
+
+def copy(engines: list[Engine]):
+    """
+    Returns a prepare function for time_calls that hands out clones of the
+    engines in turn, for calls that change them.
+    """
+    templates = itertools.cycle(engines)
+    return lambda: next(templates).clone()
+
+
+def run_cascade(engine: Engine) -> None:
+    """
+    Ticks the engine until the rows are deleted and every falling block has
+    landed.
+    """
+    while engine.state_machine.state == "clearing_rows":
+        engine.tick()
+
+
+def bench_board(width: int, height: int, fill: float, repeat: int) -> dict:
+    """
+    Times the hot paths of Engine on synthetic boards of the given size and
+    fill level, and returns microseconds per call by benchmark name.
+    """
+    moving = moving_engines(width, height, fill)
+    landed = [engine.clone() for engine in moving]
+    for engine in landed:
+        engine.shift(0, engine.drop_distance(engine.active_blocks))
+    clearing = [
+        make_engine(width, height, fill, seed, full_interval=FULL_ROW_INTERVAL)
+        for seed in range(len(SHAPES))
+    ]
+    instant = [
+        make_engine(
+            width,
+            height,
+            fill,
+            seed,
+            full_interval=FULL_ROW_INTERVAL,
+            instant_cascades=True,
+        )
+        for seed in range(len(SHAPES))
+    ]
+
+    benchmarks = {
+        "can_move_down": (reuse(moving), Engine.can_move_down),
+        "can_move_left": (reuse(moving), Engine.can_move_left),
+        "can_move_right": (reuse(moving), Engine.can_move_right),
+        "rotate": (copy(walled_engines(width, height, fill)), Engine.rotate),
+        "ghost_blocks": (reuse(moving), Engine.ghost_blocks),
+        "key_move_shape_fully_down": (
+            copy(moving),
+            Engine.key_move_shape_fully_down,
+        ),
+        "deactivate_blocks": (copy(landed), Engine.deactivate_blocks),
+        "get_filled_rows": (reuse(clearing), Engine.get_filled_rows),
+        "delete_rows": (
+            copy(clearing),
+            lambda engine: engine.delete_rows(engine.get_filled_rows()),
+        ),
+        "cascade": (copy(clearing), run_cascade),
+        "instant_cascade": (copy(instant), run_cascade),
+    }
+    return {
+        name: time_calls(prepare, call, repeat=repeat) * 1e6
+        for name, (prepare, call) in benchmarks.items()
+    }
+
+
+def bench_throughput(width: int, height: int) -> float:
+    """
+    Returns how many pieces per second whole games with random input place.
+    """
+    pieces = 0
+    start = time.perf_counter()
+    for seed in range(THROUGHPUT_GAMES):
+        pieces += play_game(seed, "random", THROUGHPUT_TICKS, width, height).pieces
+    return pieces / (time.perf_counter() - start)
+
+
+def run_benchmarks(
+    sizes=SIZES, fill_levels=FILL_LEVELS, repeat: int = REPEAT, log=print
+) -> dict[str, dict]:
+    """
+    Runs every benchmark and returns {key: {"value": value, "unit": unit}},
+    where the key names the benchmark, board size and fill level.
+    """
+    results = {}
+
+    def add(key, value, unit):
+        results[key] = {"value": value, "unit": unit}
+        log(f"{key}: {value:.2f} {unit}")
+
+    for width, height in sizes:
+        for fill in fill_levels:
+            for name, value in bench_board(width, height, fill, repeat).items():
+                add(f"{name} {width}x{height} fill {fill:.2f}", value, "us")
+        add(
+            f"pieces_per_second {width}x{height}",
+            bench_throughput(width, height),
+            "pieces/s",
+        )
+    return results
+
+
+def compare(
+    results: dict[str, dict], baseline: dict[str, dict], threshold: float = THRESHOLD
+) -> list[str]:
+    """
+    Returns the keys of the results that are more than threshold worse than
+    the same benchmark in the baseline. Benchmarks missing from either are
+    skipped.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old = baseline[key]["value"]
+        new = result["value"]
+        if result["unit"] in HIGHER_IS_BETTER:
+            worse = new < old / (1 + threshold)
+        else:
+            worse = new > old * (1 + threshold)
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    width, _, height = text.partition("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot paths of the game.")
+    parser.add_argument(
+        "--output", default="benchmarks.json", help="where to write the results"
+    )
+    parser.add_argument(
+        "--compare", metavar="BASELINE", help="a results file to check against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="the fraction a result may get worse by before it is a regression",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=parse_size,
+        default=SIZES,
+        help="board sizes as WIDTHxHEIGHT",
+    )
+    parser.add_argument("--fill", nargs="+", type=float, default=FILL_LEVELS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.fill, args.repeat)
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for key in regressions:
+            print(
+                f"regression: {key} went from {baseline[key]['value']:.2f} "
+                f"to {results[key]['value']:.2f} {results[key]['unit']}"
+            )
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import time
+from collections import OrderedDict, deque
+from typing import Callable, NamedTuple
+
+from engine import (
+    CORNERS,
+    KICKS,
+    ORIENTATIONS,
+    QUEUE_LENGTH,
+    Board,
+    Cascade,
+    get_shape_masks,
+    get_zobrist_keys,
+    hash_rows,
+)
+
+# Weights of the default evaluator, from Yiyuan Lee's Tetris AI
+HEIGHT_WEIGHT = -0.510066  # Per row of height summed over every column
+LINES_WEIGHT = 0.760666  # Per row deleted
+HOLES_WEIGHT = -0.35663  # Per empty tile with a block somewhere above it
+BUMPINESS_WEIGHT = -0.184483  # Per row of height difference between neighbors
+BEAM_WIDTH = 2  # The number of best placements searched deeper at each level
+TIME_BUDGET = 1 / 60  # The seconds a decision may take, one frame by default
+CACHE_SIZE = 50_000  # The most positions kept in the transposition cache
+
+
+class Weights(NamedTuple):
+    height: float
+    lines: float
+    holes: float
+    bumpiness: float
+
+
+DEFAULT_WEIGHTS = Weights(HEIGHT_WEIGHT, LINES_WEIGHT, HOLES_WEIGHT, BUMPINESS_WEIGHT)
+
+
+class Placement(NamedTuple):
+    orientation: int
+    x: int  # The x of the tile the shape spawned at, as in Engine.shape_x
+    y: int
+    actions: tuple[str, ...]  # The actions that move the shape here and lock it
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate_board(
+    rows: tuple[int, ...], width: int, lines: int, weights: Weights = DEFAULT_WEIGHTS
+) -> float:
+    """
+    Scores a board given as row bitmasks after a placement that deleted the
+    given number of rows. Higher is better. Other weights can be tried with
+    functools.partial(evaluate_board, weights=...), which stays picklable.
+    """
+    heights = [0] * width
+    holes = 0
+    seen = 0
+    height = len(rows)
+    for y, mask in enumerate(rows):
+        new = mask & ~seen
+        while new:
+            bit = new & -new
+            heights[bit.bit_length() - 1] = height - y
+            new ^= bit
+        seen |= mask
+        holes += (seen & ~mask).bit_count()
+    bumpiness = sum(abs(heights[x] - heights[x + 1]) for x in range(width - 1))
+    return (
+        weights.height * sum(heights)
+        + weights.lines * lines
+        + weights.holes * holes
+        + weights.bumpiness * bumpiness
+    )
+
+
+def clear_rows(rows: list[int], width: int) -> tuple[tuple[int, ...], int]:
+    """
+    Deletes the full rows of a board given as row bitmasks the way Engine
+    does, letting the blocks above fall as clusters and deleting any rows they
+    fill, and returns the resulting rows and the number of rows deleted.
+    """
+    height = len(rows)
+    full_row = (1 << width) - 1
+    lines = 0
+    while True:
+        filled = {y for y, mask in enumerate(rows) if mask == full_row}
+        if not filled:
+            return tuple(rows), lines
+        lines += len(filled)
+        lowest = max(filled)
+        board = Board(width, height)
+        falling = []
+        for y, mask in enumerate(rows):
+            for x in range(width):
+                if mask >> x & 1:
+                    if y > lowest:
+                        board.place(x, y, 0)
+                    elif y not in filled:
+                        falling.append([x, y, 0])
+        cascade = Cascade(board, falling)
+        for label, (x, y, _) in zip(cascade.labels, falling):
+            board.place(x, y + cascade.remaining[label], 0)
+        rows = board.rows
+
+
+def find_placements(
+    rows: tuple[int, ...], width: int, shape: int, start: tuple[int, int, int]
+) -> tuple[list[tuple[int, int, int]], dict]:
+    """
+    Searches every (orientation, x, y) the shape can reach from start with
+    the same left, right, rotate and down moves as Engine. Returns the ones
+    where the shape cannot move down any further, together with the move that
+    reached each position from the one before it, as
+    {position: (previous position, action)}. Moving down is preferred over
+    other moves, so that the shape is moved sideways as high as it can be,
+    and "fall" marks the shape falling through the rows above every block.
+    """
+    height = len(rows)
+    masks = get_shape_masks(width)[shape]
+    corners = CORNERS[shape]
+
+    # The same test as Board.can_place, relative to the tile the shape spawned at
+    def fits(orientation, x, y):
+        corner_x, corner_y = corners[orientation]
+        x += corner_x
+        y += corner_y
+        offsets = masks[orientation]
+        if x < 0 or x >= len(offsets) or y < 0:
+            return False
+        shape_rows = offsets[x]
+        if y + len(shape_rows) > height:
+            return False
+        for i, mask in enumerate(shape_rows):
+            if rows[y + i] & mask:
+                return False
+        return True
+
+    parents = {start: None}
+    placements = []
+    if not fits(*start):
+        # The shape does not fit where it spawned, so the game is over
+        return placements, parents
+
+    # Above the highest block and below the top of the board every left,
+    # right and rotate move can be made in any row with the same result, so
+    # the shape can fall straight to the lowest such row before searching
+    top = next((y for y, mask in enumerate(rows) if mask), height)
+    free_row = min(top - corners[o][1] - len(masks[o][0]) for o in range(4))
+    orientation, x, y = start
+    if free_row > y and free_row >= -min(corner_y for _, corner_y in corners):
+        parents[(orientation, x, free_row)] = ((orientation, x, y), "fall")
+        y = free_row
+    queue = deque([(orientation, x, y)])
+
+    while queue:
+        position = queue.popleft()
+        orientation, x, y = position
+        moves = []
+        if fits(orientation, x - 1, y):
+            moves.append(((orientation, x - 1, y), "left"))
+        if fits(orientation, x + 1, y):
+            moves.append(((orientation, x + 1, y), "right"))
+        rotated = (orientation + 1) % 4
+        for kick in KICKS:
+            if fits(rotated, x + kick, y):
+                moves.append(((rotated, x + kick, y), "rotate"))
+                break
+        if fits(orientation, x, y + 1):
+            moves.append(((orientation, x, y + 1), "down"))
+        else:
+            placements.append(position)
+        for move, action in moves:
+            if move not in parents:
+                parents[move] = (position, action)
+                queue.append(move)
+            elif action == "down":
+                parents[move] = (position, action)
+    return placements, parents
+
+
+def place(rows: tuple[int, ...], width: int, shape: int, position) -> list[int]:
+    """
+    Returns the row bitmasks of the board after locking the shape at position.
+    """
+    orientation, x, y = position
+    corner_x, corner_y = CORNERS[shape][orientation]
+    rows = list(rows)
+    for i, mask in enumerate(get_shape_masks(width)[shape][orientation][x + corner_x]):
+        rows[y + corner_y + i] |= mask
+    return rows
+
+
+class Bot:
+    """
+    Chooses where to put the active shape by trying every placement it can
+    reach, then every placement of the shapes in the queue after it, and
+    scoring the resulting boards with evaluator, which is called as
+    evaluator(rows, width, lines) and returns a higher number for a better
+    board.
+
+    Only the beam_width best placements at each level, by the evaluator, are
+    searched deeper. The search deepens one shape at a time until lookahead
+    queued shapes are included or time_budget seconds have passed, and the
+    best placement of the deepest finished search is used. Values of
+    positions already searched are kept in a transposition cache of at most
+    cache_size entries, dropping the least recently used, so that a position
+    reached by placing shapes in a different order is only searched once.
+    Positions are keyed by the Zobrist hash of their board, which is updated
+    with the keys of the placed tiles unless the placement deleted rows.
+    """
+
+    def __init__(
+        self,
+        evaluator: Callable[[tuple[int, ...], int, int], float] = evaluate_board,
+        lookahead: int = QUEUE_LENGTH,
+        beam_width: int = BEAM_WIDTH,
+        time_budget: float = TIME_BUDGET,
+        cache_size: int = CACHE_SIZE,
+        clock=time.perf_counter,
+    ):
+        self.evaluator = evaluator
+        self.lookahead = lookahead
+        self.beam_width = beam_width
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self.clock = clock
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.center = None  # Where shapes spawn on the board being searched
+        self.planned_piece = None  # The number of the last shape planned for
+
+    def __call__(self, engine) -> list[str] | None:
+        """
+        Returns every action needed to place the active shape the first time
+        it is called for that shape, for use as a simulate policy.
+        """
+        if engine.state_machine.state != "shape_moving":
+            return None
+        if engine.pieces == self.planned_piece:
+            return None
+        self.planned_piece = engine.pieces
+        placement = self.choose(engine)
+        return list(placement.actions) if placement else None
+
+    def choose(self, engine) -> Placement | None:
+        """
+        Returns the best placement of the engine's active shape, or None if
+        no shape is moving.
+        """
+        if engine.state_machine.state != "shape_moving":
+            return None
+        width = engine.board.width
+        self.center = engine.center
+        rows = tuple(engine.board.rows)
+        start = (engine.orientation, engine.shape_x, engine.shape_y)
+        placements, parents = find_placements(rows, width, engine.shape, start)
+        if not placements:
+            return None
+        candidates = self.rank(
+            rows, engine.board.hash, width, engine.shape, placements, 0
+        )
+        best = candidates[0][1]
+
+        queue = tuple(engine.shape_queue[: self.lookahead])
+        deadline = self.clock() + self.time_budget
+        for depth in range(1, len(queue) + 1):
+            try:
+                values = [
+                    (
+                        self.search(
+                            next_rows, next_hash, width, queue[:depth], lines, deadline
+                        ),
+                        i,
+                    )
+                    for i, (_, _, next_rows, next_hash, lines) in enumerate(
+                        candidates[: self.beam_width]
+                    )
+                ]
+            except SearchTimeout:
+                break
+            best = candidates[max(values)[1]][1]
+        return Placement(*best, self.get_actions(parents, best))
+
+    def rank(
+        self,
+        rows: tuple[int, ...],
+        row_hash: int,
+        width: int,
+        shape: int,
+        placements: list[tuple[int, int, int]],
+        lines: int,
+    ) -> list[tuple[float, tuple[int, int, int], tuple[int, ...], int, int]]:
+        """
+        Locks the shape at each placement and scores the board it leaves.
+        Returns (value, placement, rows, hash, lines) for each, best first,
+        where lines includes the rows deleted by the placement.
+        """
+        keys, tables = get_zobrist_keys(width, len(rows))
+        candidates = []
+        for position in placements:
+            next_rows, cleared = clear_rows(place(rows, width, shape, position), width)
+            if cleared:
+                next_hash = hash_rows(next_rows, tables)
+            else:
+                orientation, x, y = position
+                next_hash = row_hash
+                for dx, dy in ORIENTATIONS[shape][orientation]:
+                    next_hash ^= keys[y + dy][x + dx]
+            value = self.evaluator(next_rows, width, lines + cleared)
+            candidates.append((value, position, next_rows, next_hash, lines + cleared))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates
+
+    def search(
+        self,
+        rows: tuple[int, ...],
+        row_hash: int,
+        width: int,
+        shapes: tuple[int, ...],
+        lines: int,
+        deadline: float,
+    ) -> float:
+        """
+        Returns the value of the best board reachable by placing the shapes in
+        order as they spawn, or minus infinity if the game ends first.
+        """
+        key = (row_hash, shapes, lines)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+            return self.cache[key]
+        self.cache_misses += 1
+        if self.clock() > deadline:
+            raise SearchTimeout()
+
+        placements, _ = find_placements(rows, width, shapes[0], (0, self.center, 0))
+        candidates = self.rank(rows, row_hash, width, shapes[0], placements, lines)
+        if not candidates:
+            value = float("-inf")
+        elif len(shapes) == 1:
+            value = candidates[0][0]
+        else:
+            value = max(
+                self.search(
+                    next_rows, next_hash, width, shapes[1:], next_lines, deadline
+                )
+                for _, _, next_rows, next_hash, next_lines in candidates[
+                    : self.beam_width
+                ]
+            )
+
+        self.cache[key] = value
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return value
+
+    @staticmethod
+    def get_actions(parents: dict, position: tuple[int, int, int]) -> tuple[str, ...]:
+        """
+        Returns the actions that move the shape from where the search started
+        to position and lock it there: the rotations and moves sideways that
+        can be made where it spawned, any moves down needed to tuck it under
+        blocks, and a drop.
+        """
+        actions = []
+        fall = 0
+        while parents[position] is not None:
+            previous, action = parents[position]
+            if action == "fall":
+                fall = position[2] - previous[2]
+            else:
+                actions.append(action)
+            position = previous
+        actions.reverse()
+        if fall:
+            # Every move made right after the fall has the same result before it
+            moves = 0
+            while moves < len(actions) and actions[moves] != "down":
+                moves += 1
+            actions[moves:moves] = ["down"] * fall
+        # The drop takes the shape as far down as the last moves down would
+        while actions and actions[-1] == "down":
+            actions.pop()
+        actions.append("drop")
+        return tuple(actions)
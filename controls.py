@@ -0,0 +1,116 @@
+import time
+
+from engine import X_TILES, Y_TILES
+
+DELAYED_AUTO_SHIFT = 0.17  # The seconds a key is held before it starts repeating
+AUTO_REPEAT_RATE = 0.05  # The seconds between repeats, 0 to move as far as possible
+REPEATING_ACTIONS = ("left", "right", "down")  # The actions that repeat when held
+MAX_ROTATIONS = 4  # The most rotations applied on one frame
+# The most milliseconds between a release and a press of the same key for them
+# to be taken as the operating system repeating a key that is still held
+AUTOREPEAT_TOLERANCE = 1
+
+
+class Controls:
+    """
+    Turns key presses and releases into the actions to apply on each frame.
+
+    Pressing a key queues its action once. Holding left, right or down
+    repeats the action every auto_repeat_rate seconds once the key has been
+    held for delayed_auto_shift seconds, with a rate of 0 moving the shape as
+    far as it goes. The key repeat of the operating system is ignored: a
+    press of a key that is already held does nothing, and on X11, where a
+    held key sends a release and a press with the same timestamp, the
+    release is only acted on if no such press follows it before the frame.
+
+    poll is called once per frame and nets out everything since the last
+    frame, so that a frame applies the rotations pressed, up to
+    MAX_ROTATIONS, one horizontal run of moves, the soft drops and one hard
+    drop, in that order, however many events arrived. Rotations are applied
+    before the moves even if they were pressed after them. They are not
+    netted out, since kicks can leave a shape that was rotated four times
+    somewhere else.
+    """
+
+    def __init__(
+        self,
+        width: int = X_TILES,
+        height: int = Y_TILES,
+        delayed_auto_shift: float = DELAYED_AUTO_SHIFT,
+        auto_repeat_rate: float = AUTO_REPEAT_RATE,
+        clock=time.perf_counter,
+    ):
+        self.width = width
+        self.height = height
+        self.delayed_auto_shift = delayed_auto_shift
+        self.auto_repeat_rate = auto_repeat_rate
+        self.clock = clock
+        # The time each held key repeats next, by action
+        self.held = {}
+        # The timestamp of releases waiting to see if a repeated press follows
+        self.pending_releases = {}
+        # The actions pressed since the last poll
+        self.pressed = []
+
+    def press(self, action: str, event_time: int = 0) -> None:
+        """
+        Handles a key for the action being pressed at event_time, the
+        millisecond timestamp of the key event.
+        """
+        release_time = self.pending_releases.pop(action, None)
+        if release_time is not None:
+            if event_time - release_time <= AUTOREPEAT_TOLERANCE:
+                return
+            del self.held[action]
+        if action in self.held:
+            return
+        self.held[action] = self.clock() + self.delayed_auto_shift
+        self.pressed.append(action)
+
+    def release(self, action: str, event_time: int = 0) -> None:
+        """
+        Handles a key for the action being released at event_time.
+        """
+        if action in self.held:
+            self.pending_releases[action] = event_time
+
+    def release_all(self) -> None:
+        """
+        Lets go of every key, for when the window loses focus.
+        """
+        self.held.clear()
+        self.pending_releases.clear()
+
+    def poll(self) -> list[str]:
+        """
+        Returns the actions to apply on this frame, in the order to apply them.
+        """
+        for action in self.pending_releases:
+            del self.held[action]
+        self.pending_releases.clear()
+
+        counts = {"rotate": 0, "left": 0, "right": 0, "down": 0, "drop": 0}
+        for action in self.pressed:
+            counts[action] += 1
+        self.pressed = []
+
+        now = self.clock()
+        limits = {"left": self.width, "right": self.width, "down": self.height}
+        for action, next_repeat in self.held.items():
+            if action not in REPEATING_ACTIONS or next_repeat > now:
+                continue
+            if self.auto_repeat_rate <= 0:
+                counts[action] += limits[action]
+                continue
+            repeats = int((now - next_repeat) // self.auto_repeat_rate) + 1
+            counts[action] += repeats
+            self.held[action] = next_repeat + repeats * self.auto_repeat_rate
+
+        shift = counts["right"] - counts["left"]
+        shift = max(-self.width, min(self.width, shift))
+        actions = ["rotate"] * min(counts["rotate"], MAX_ROTATIONS)
+        actions += ["right" if shift > 0 else "left"] * abs(shift)
+        actions += ["down"] * min(counts["down"], self.height)
+        if counts["drop"]:
+            actions.append("drop")
+        return actions
@@ -0,0 +1,948 @@
+import heapq
+import random
+from typing import NamedTuple
+
+# GLOBAL CONSTANTS
+X_TILES = 10  # The number of tiles in the x direction of the Tetris board
+Y_TILES = 20  # The number of tiles in the y direction of the Tetris board
+QUEUE_LENGTH = 3  # The length of the queue
+ACTIONS = ("left", "right", "rotate", "down", "drop")  # The inputs a player can make
+LINES_PER_LEVEL = 10  # The number of rows to delete to reach the next level
+BASE_TICK_INTERVAL = 1 / 3  # The seconds between steps of gravity at level 1
+TICK_INTERVAL_DECAY = 0.85  # The factor the interval shrinks by at each level
+MIN_TICK_INTERVAL = 1 / 30  # The shortest interval between steps of gravity
+SOFT_DROP_POINTS = 10  # The points for each row a shape is moved down by a key
+HARD_DROP_POINTS = 10  # The points for a hard drop, times the square of its rows
+KICKS = (0, -1, 1)  # The x offsets tried in order when a rotation collides
+ZOBRIST_SEED = 0x7E7215  # The seed of the random keys boards are hashed with
+# Maps the codes in Board.cells to "0" for an empty tile and "1" otherwise
+OCCUPANCY_DIGITS = bytes.maketrans(bytes(range(256)), b"0" + b"1" * 255)
+
+# Shapes and their rotation points relative to the tile the shape spawns at
+SHAPES = [
+    [[1, 0], [0, 1], [1, 1], [2, 1]],
+    [[2, 0], [0, 1], [1, 1], [2, 1]],
+    [[0, 0], [0, 1], [1, 1], [2, 1]],
+    [[0, 0], [0, 1], [0, 2], [0, 3]],
+    [[0, 0], [0, 1], [1, 1], [1, 2]],
+    [[0, 0], [0, 1], [1, 0], [1, 1]],
+    [[1, 0], [1, 1], [0, 1], [0, 2]],
+]
+ROTATION_POINTS = [
+    [1, 1],
+    [1, 1],
+    [1, 1],
+    [-0.5, 1.5],
+    [0, 1],
+    [0.5, 0.5],
+    [1, 1],
+]
+
+
+def build_orientations(
+    shape: list[list[int]], rotation_point: list[float]
+) -> list[list[tuple[int, int]]]:
+    """
+    Returns the tiles of a shape in each of its four orientations, relative to
+    the tile it spawns at, by repeatedly rotating it 90 degrees clockwise
+    around its rotation point. The order of the tiles is kept the same.
+    """
+    px, py = rotation_point
+    cells = [tuple(cell) for cell in shape]
+    orientations = []
+    for _ in range(4):
+        orientations.append(cells)
+        cells = [(int(px + py - y), int(py - px + x)) for x, y in cells]
+    return orientations
+
+
+# The tiles of every shape in every orientation, indexed [shape][orientation]
+ORIENTATIONS = [
+    build_orientations(shape, rotation_point)
+    for shape, rotation_point in zip(SHAPES, ROTATION_POINTS)
+]
+# The offset of the top left corner of every shape in every orientation from
+# the tile it spawns at, indexed [shape][orientation]
+CORNERS = [
+    [(min(x for x, _ in tiles), min(y for _, y in tiles)) for tiles in orientations]
+    for orientations in ORIENTATIONS
+]
+
+
+def build_shape_masks(
+    orientations: list[list[tuple[int, int]]], width: int
+) -> list[list[tuple[int, ...]]]:
+    """
+    Precomputes the row bitmasks of a shape for each of its orientations and
+    every x offset at which it fits on a board of the given width. Each entry
+    holds one mask per row of the shape, starting from its top row.
+    """
+    shape_masks = []
+    for cells in orientations:
+        min_x = min(x for x, _ in cells)
+        min_y = min(y for _, y in cells)
+        masks = [0] * (max(y for _, y in cells) - min_y + 1)
+        for x, y in cells:
+            masks[y - min_y] |= 1 << (x - min_x)
+        shape_width = max(x for x, _ in cells) - min_x + 1
+        shape_masks.append(
+            [tuple(m << x for m in masks) for x in range(width - shape_width + 1)]
+        )
+    return shape_masks
+
+
+# Shape masks for every board width in use, indexed [width][shape][orientation][x]
+shape_masks_by_width = {}
+
+
+def get_shape_masks(width: int) -> list[list[list[tuple[int, ...]]]]:
+    """
+    Returns the row bitmasks of every shape for a board of the given width,
+    building them the first time a width is used.
+    """
+    if width not in shape_masks_by_width:
+        shape_masks_by_width[width] = [
+            build_shape_masks(orientations, width) for orientations in ORIENTATIONS
+        ]
+    return shape_masks_by_width[width]
+
+
+# Zobrist keys for every board size in use, indexed [(width, height)]
+zobrist_keys_by_size = {}
+
+
+def get_zobrist_keys(
+    width: int, height: int
+) -> tuple[list[list[int]], list[list[list[int]]]]:
+    """
+    Returns a random 64 bit key for every tile of a board of the given size,
+    indexed [y][x], and tables indexed [y][i][byte] that hold the XOR of the
+    keys of the tiles set in byte i of the bitmask of row y. A board's hash is
+    the XOR of the keys of its occupied tiles, so it is updated with one XOR
+    per block placed or removed, and the tables hash a whole board a byte of
+    each row at a time.
+    """
+    if (width, height) not in zobrist_keys_by_size:
+        generator = random.Random(ZOBRIST_SEED)
+        keys = [
+            [generator.getrandbits(64) for _ in range(width)] for _ in range(height)
+        ]
+        tables = []
+        for row_keys in keys:
+            row_tables = []
+            for i in range(0, width, 8):
+                table = [0] * 256
+                for value in range(1, 256):
+                    bit = value & -value
+                    x = i + bit.bit_length() - 1
+                    key = row_keys[x] if x < width else 0
+                    table[value] = table[value ^ bit] ^ key
+                row_tables.append(table)
+            tables.append(row_tables)
+        zobrist_keys_by_size[(width, height)] = (keys, tables)
+    return zobrist_keys_by_size[(width, height)]
+
+
+def hash_rows(rows, tables: list[list[list[int]]]) -> int:
+    """
+    Returns the Zobrist hash of a board given as row bitmasks.
+    """
+    result = 0
+    for mask, row_tables in zip(rows, tables):
+        for table in row_tables:
+            if mask == 0:
+                break
+            result ^= table[mask & 0xFF]
+            mask >>= 8
+    return result
+
+
+class StateMachine:
+    def __init__(self):
+        self.states = [
+            "shape_moving",
+            "clearing_rows",
+            "spawn_shape",
+            "paused",
+            "game_over",
+        ]
+        self.state = "spawn_shape"
+        self.previous_state = None
+
+    def set_state(self, state: str) -> None:
+        if state in self.states:
+            self.previous_state = self.state
+            self.state = state
+
+
+def label_components(blocks: list[list[int]]) -> list[int]:
+    """
+    Groups blocks that touch above, below, left or right into connected
+    clusters with union-find and returns the label of each block's cluster.
+    Two blocks have the same label if and only if they are in the same cluster.
+    """
+    parent = list(range(len(blocks)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = {(b[0], b[1]): i for i, b in enumerate(blocks)}
+    for i, b in enumerate(blocks):
+        for neighbor in ((b[0] + 1, b[1]), (b[0], b[1] + 1)):
+            j = index.get(neighbor)
+            if j is not None:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+    return [find(i) for i in range(len(blocks))]
+
+
+class Cascade:
+    """
+    The blocks that fall after rows are deleted. They fall together one row
+    per tick, and each connected cluster of them stops and locks as soon as it
+    lands on the floor or an inactive block. Clusters keep their shape while
+    they fall, so how far each one falls is worked out once when the cascade
+    starts: a cluster falls as far as the smallest gap below one of its blocks
+    to the floor or an inactive block, or the gap to a block of another
+    cluster plus however far that cluster falls. Those distances are shortest
+    paths up from the floor, found with Dijkstra's algorithm.
+
+    labels holds the cluster label of each falling block and remaining holds
+    how many rows each cluster has left to fall.
+    """
+
+    __slots__ = ("labels", "remaining")
+
+    def __init__(self, board: "Board", blocks: list[list[int]]):
+        self.labels = label_components(blocks)
+        self.remaining = self.get_drop_distances(board, blocks)
+
+    def get_drop_distances(
+        self, board: "Board", blocks: list[list[int]]
+    ) -> dict[int, int]:
+        """
+        Returns how far each cluster falls before it lands, by label.
+        """
+        distances = {label: board.height for label in self.labels}
+        # Clusters resting on each cluster, with the gap between them
+        above = {label: [] for label in self.labels}
+        columns = {}
+        for i, b in enumerate(blocks):
+            columns.setdefault(b[0], []).append(i)
+        for x, column in columns.items():
+            column.sort(key=lambda i: blocks[i][1], reverse=True)
+            below = None
+            for i in column:
+                label = self.labels[i]
+                y = blocks[i][1]
+                if below is None:
+                    distance = board.drop_distance(x, y)
+                    distances[label] = min(distances[label], distance)
+                elif self.labels[below] != label:
+                    gap = blocks[below][1] - y - 1
+                    above[self.labels[below]].append((label, gap))
+                below = i
+
+        heap = [(distance, label) for label, distance in distances.items()]
+        heapq.heapify(heap)
+        done = set()
+        while heap:
+            distance, label = heapq.heappop(heap)
+            if label in done:
+                continue
+            done.add(label)
+            for upper, gap in above[label]:
+                if distance + gap < distances[upper]:
+                    distances[upper] = distance + gap
+                    heapq.heappush(heap, (distance + gap, upper))
+        return distances
+
+    def get_landed(self, board: "Board", blocks: list[list[int]]) -> set[int]:
+        """
+        Returns the labels of the clusters that have finished falling and rest
+        on the floor or an inactive block. A cluster resting only on another
+        cluster that has not locked yet lands on the tick after that one.
+        """
+        stopped = {label for label, left in self.remaining.items() if left == 0}
+        landed = set()
+        for label, b in zip(self.labels, blocks):
+            if label in stopped and (
+                b[1] + 1 == board.height or board.is_occupied(b[0], b[1] + 1)
+            ):
+                landed.add(label)
+        return landed
+
+    def fall(self) -> None:
+        """
+        Records that every cluster fell by one row.
+        """
+        for label in self.remaining:
+            self.remaining[label] -= 1
+
+    def remove(self, labels: set[int]) -> list[int]:
+        """
+        Forgets the clusters with the given labels and returns the indices of
+        their blocks in descending order.
+        """
+        indices = [i for i, label in enumerate(self.labels) if label in labels]
+        indices.reverse()
+        for i in indices:
+            del self.labels[i]
+        for label in labels:
+            del self.remaining[label]
+        return indices
+
+    def freeze(self) -> tuple:
+        """
+        Returns the cascade as nested tuples, to be turned back into a cascade
+        by thaw.
+        """
+        return tuple(self.labels), tuple(self.remaining.items())
+
+    @staticmethod
+    def thaw(frozen: tuple) -> "Cascade":
+        cascade = Cascade.__new__(Cascade)
+        cascade.labels = list(frozen[0])
+        cascade.remaining = dict(frozen[1])
+        return cascade
+
+
+class Snapshot(NamedTuple):
+    """
+    An immutable copy of everything needed to continue a game, taken with
+    Engine.snapshot. The board is packed into one byte per tile, row by row,
+    holding 0 for an empty tile or one more than the shape of its block.
+    """
+
+    board: bytes
+    board_hash: int  # The Zobrist hash of the board, as in Board.hash
+    active_blocks: tuple[tuple[int, int, int], ...]
+    shape: int | None
+    orientation: int
+    shape_x: int
+    shape_y: int
+    cascade: tuple | None  # As returned by Cascade.freeze
+    shape_queue: tuple[int, ...]
+    random_state: tuple
+    state: str
+    previous_state: str | None
+    score: int
+    lines: int
+    pieces: int
+    ticks: int
+
+
+class Board:
+    """
+    The inactive tiles of a Tetris board. Occupancy is stored as one bitmask
+    per row, where bit x is set if tile x is occupied, and the shape each tile
+    came from is kept alongside it so that views know what color to draw.
+
+    Shapes are kept in cells, a bytearray with one byte per tile, row by row,
+    holding 0 for an empty tile or one more than the shape of its block. Views
+    keep their own canvas items, so a board is only a few hundred bytes and
+    many of them can be held at once by simulators and searches.
+
+    The row of the highest block in each column is kept in surface, or the
+    height of the board for an empty column, so that the row a block lands on
+    can be found without stepping it down one row at a time.
+    """
+
+    __slots__ = (
+        "width",
+        "height",
+        "full_row",
+        "rows",
+        "cells",
+        "surface",
+        "shape_masks",
+        "zobrist_keys",
+        "zobrist_tables",
+        "hash",
+    )
+
+    def __init__(self, width: int = X_TILES, height: int = Y_TILES):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.rows = [0] * height
+        self.cells = bytearray(width * height)
+        self.surface = [height] * width
+        # Row bitmasks of every shape, indexed [shape][orientation][x]
+        self.shape_masks = get_shape_masks(width)
+        self.zobrist_keys, self.zobrist_tables = get_zobrist_keys(width, height)
+        self.hash = 0  # The XOR of the Zobrist keys of every occupied tile
+
+    def is_occupied(self, x: int, y: int) -> bool:
+        """
+        Checks if the tile at (x, y) holds an inactive block. Tiles outside
+        of the board are never occupied, walls are checked separately.
+        """
+        return (
+            0 <= x < self.width and 0 <= y < self.height and self.rows[y] >> x & 1 == 1
+        )
+
+    def can_place(self, shape: int, orientation: int, x: int, y: int) -> bool:
+        """
+        Checks if a shape in the given orientation fits with its top left
+        corner at (x, y) without overlapping the walls, floor or inactive blocks.
+        """
+        offsets = self.shape_masks[shape][orientation]
+        if x < 0 or x >= len(offsets):
+            return False
+        masks = offsets[x]
+        if y < 0 or y + len(masks) > self.height:
+            return False
+        for i, mask in enumerate(masks):
+            if self.rows[y + i] & mask:
+                return False
+        return True
+
+    def place(self, x: int, y: int, shape: int) -> None:
+        """
+        Fills the tile at (x, y) with a block of the given shape.
+        """
+        self.rows[y] |= 1 << x
+        self.cells[y * self.width + x] = shape + 1
+        self.hash ^= self.zobrist_keys[y][x]
+        if y < self.surface[x]:
+            self.surface[x] = y
+
+    def remove(self, x: int, y: int) -> int:
+        """
+        Empties the tile at (x, y) and returns the shape of the removed block.
+        """
+        self.rows[y] &= ~(1 << x)
+        i = y * self.width + x
+        shape = self.cells[i] - 1
+        self.cells[i] = 0
+        self.hash ^= self.zobrist_keys[y][x]
+        if y == self.surface[x]:
+            self.surface[x] = self.first_occupied_below(x, y)
+        return shape
+
+    def first_occupied_below(self, x: int, y: int) -> int:
+        """
+        Returns the row of the first occupied tile below (x, y) in its column,
+        or the height of the board if there is none.
+        """
+        bit = 1 << x
+        for row in range(y + 1, self.height):
+            if self.rows[row] & bit:
+                return row
+        return self.height
+
+    def drop_distance(self, x: int, y: int) -> int:
+        """
+        Returns how many rows a block at (x, y) can fall before it lands.
+        """
+        surface = self.surface[x]
+        if y < surface:
+            return surface - y - 1
+        # The block is tucked under an overhang, so look below it instead
+        return self.first_occupied_below(x, y) - y - 1
+
+    def get_filled_rows(self) -> set[int]:
+        """
+        Returns a set of the row number of filled rows.
+        """
+        return {y for y, mask in enumerate(self.rows) if mask == self.full_row}
+
+    def clear(self) -> None:
+        """
+        Empties every tile on the board.
+        """
+        self.rows = [0] * self.height
+        self.cells[:] = bytes(len(self.cells))
+        self.surface = [self.height] * self.width
+        self.hash = 0
+
+    def get_shape(self, x: int, y: int) -> int | None:
+        """
+        Returns the shape of the block at (x, y), or None for an empty tile.
+        """
+        code = self.cells[y * self.width + x]
+        return code - 1 if code else None
+
+    def pack(self) -> bytes:
+        """
+        Returns every tile as one byte, row by row, in the same codes as cells.
+        """
+        return bytes(self.cells)
+
+    def unpack(self, data: bytes, board_hash: int) -> None:
+        """
+        Fills the board from bytes returned by pack and the hash it had then.
+        """
+        width = self.width
+        self.cells[:] = data
+        # Turn each row into a string of bits, highest x first, to read its mask
+        bits = data.translate(OCCUPANCY_DIGITS)
+        self.rows = [
+            int(bits[(y + 1) * width - 1 : y * width - 1 if y else None : -1], 2)
+            for y in range(self.height)
+        ]
+        self.surface = [self.height] * width
+        seen = 0
+        for y, mask in enumerate(self.rows):
+            new = mask & ~seen
+            while new:
+                bit = new & -new
+                self.surface[bit.bit_length() - 1] = y
+                new ^= bit
+            seen |= mask
+        self.hash = board_hash
+
+
+class Engine:
+    """
+    The rules of Tetris without any drawing. Views watch the engine by adding
+    a listener, which is called with the name of each event and its arguments:
+
+    spawn: a new shape was added to the active blocks
+    move (dx, dy): every active block moved by dx tiles right and dy tiles down
+    rotate: the active blocks were rotated, their order is unchanged
+    lock (indices, blocks): the active blocks at these indices, in descending
+        order, were deactivated and removed from the active blocks, and
+        blocks holds them as [x, y, shape] lists in the same order
+    clear (rows, falling): the rows were deleted and the inactive blocks at
+        the (x, y) positions in falling were appended to the active blocks
+    settle: every active block was moved straight to where it lands
+    score (score): the score went up to score
+    pause (paused): the game was paused or unpaused
+    game_over: the spawned shape did not fit
+    reset: the board was emptied for a new game
+    input (action): an action was applied through apply
+    restore: the game was put back into the state of a snapshot
+
+    Shapes are drawn from the engine's own random number generator, so two
+    engines created with the same seed that are given the same actions at
+    the same ticks play out the same game.
+
+    After rows are deleted the blocks above them fall one row per tick so
+    that views can animate them. Headless users that do not need this can
+    pass instant_cascades, which drops the blocks straight to where they land
+    and deletes any rows they fill within the same tick.
+    """
+
+    def __init__(
+        self,
+        width: int = X_TILES,
+        height: int = Y_TILES,
+        seed: int | None = None,
+        instant_cascades: bool = False,
+    ):
+        self.board = Board(width, height)
+        self.instant_cascades = instant_cascades
+        self.center = width // 2 - 1
+        self.state_machine = StateMachine()
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        self.shape_queue = [
+            self.random.randint(0, len(SHAPES) - 1) for _ in range(QUEUE_LENGTH)
+        ]
+
+        # The blocks in the active moving shape as [x, y, shape] lists
+        self.active_blocks = []
+        # The active shape, its orientation and the tile it spawned at moved
+        # along with it, so that its blocks are ORIENTATIONS moved by (x, y)
+        self.shape = None
+        self.orientation = 0
+        self.shape_x = 0
+        self.shape_y = 0
+        # The blocks falling after rows were deleted, or None
+        self.cascade = None
+
+        self.score = 0
+        self.lines = 0  # The number of rows deleted
+        self.pieces = 0  # The number of shapes spawned
+        self.ticks = 0  # The number of steps of gravity
+
+        # The input methods by the name of the action they perform
+        self.actions = {
+            "left": self.move_shape_left,
+            "right": self.move_shape_right,
+            "rotate": self.rotate,
+            "down": self.key_move_shape_down,
+            "drop": self.key_move_shape_fully_down,
+        }
+
+        self.listeners = []
+
+    def add_listener(self, listener) -> None:
+        """
+        Registers a callable that is notified of every event.
+        """
+        self.listeners.append(listener)
+
+    def notify(self, event: str, *args) -> None:
+        for listener in self.listeners:
+            listener(event, *args)
+
+    def is_game_over(self) -> bool:
+        return self.state_machine.state == "game_over"
+
+    def get_level(self) -> int:
+        """
+        Returns the level, which starts at 1 and goes up every LINES_PER_LEVEL rows.
+        """
+        return self.lines // LINES_PER_LEVEL + 1
+
+    def get_tick_interval(self) -> float:
+        """
+        Returns the number of seconds between steps of gravity at the current level.
+        """
+        interval = BASE_TICK_INTERVAL * TICK_INTERVAL_DECAY ** (self.get_level() - 1)
+        return max(interval, MIN_TICK_INTERVAL)
+
+    def apply(self, action: str) -> None:
+        """
+        Performs one of the actions in ACTIONS as if its key was pressed.
+        """
+        self.notify("input", action)
+        self.actions[action]()
+
+    def fits(self, orientation: int, x: int, y: int) -> bool:
+        """
+        Checks if the active shape in the given orientation, with the tile it
+        spawned at moved to (x, y), is inside the board and clear of inactive
+        blocks.
+        """
+        corner_x, corner_y = CORNERS[self.shape][orientation]
+        return self.board.can_place(self.shape, orientation, x + corner_x, y + corner_y)
+
+    def can_move_left(self) -> bool:
+        """
+        Checks if the moving shape collides with the left wall or an inactive block.
+        """
+        return self.fits(self.orientation, self.shape_x - 1, self.shape_y)
+
+    def can_move_right(self) -> bool:
+        """
+        Check if the shape collides with the right wall or an inactive block.
+        """
+        return self.fits(self.orientation, self.shape_x + 1, self.shape_y)
+
+    def can_move_down(self) -> bool:
+        """
+        Checks if the moving shape collides with the floor or an inactive block.
+        """
+        return self.fits(self.orientation, self.shape_x, self.shape_y + 1)
+
+    def shift(self, dx: int, dy: int) -> None:
+        """
+        Moves every active block and the active shape without any checks.
+        """
+        for b in self.active_blocks:
+            b[0] += dx
+            b[1] += dy
+        self.shape_x += dx
+        self.shape_y += dy
+
+    def move_shape_down(self) -> None:
+        """
+        Moves the shape down by one tile if possible.
+        """
+        if self.can_move_down():
+            self.shift(0, 1)
+            self.notify("move", 0, 1)
+        else:
+            self.deactivate_blocks()
+
+    def key_move_shape_down(self) -> None:
+        """
+        Moves the shape down by one tile forcefully by keyboard input if possible.
+        """
+        if self.state_machine.state == "shape_moving":
+            self.move_shape_down()
+            self.score += SOFT_DROP_POINTS
+            self.notify("score", self.score)
+
+    def key_move_shape_fully_down(self) -> None:
+        """
+        Moves the shape as far down as it can currently go focefully by
+        keyboard input.
+        """
+        if self.state_machine.state == "shape_moving":
+            distance = self.drop_distance(self.active_blocks)
+            if distance > 0:
+                self.shift(0, distance)
+                self.notify("move", 0, distance)
+            self.score += distance * distance * HARD_DROP_POINTS
+            if distance > 0:
+                self.notify("score", self.score)
+            self.deactivate_blocks()
+
+    def move_shape_right(self) -> None:
+        """
+        Moves the shape right by one tile if possible.
+        """
+        if self.state_machine.state == "shape_moving" and self.can_move_right():
+            self.shift(1, 0)
+            self.notify("move", 1, 0)
+
+    def move_shape_left(self) -> None:
+        """
+        Moves the shape left by one tile if possible.
+        """
+        if self.state_machine.state == "shape_moving" and self.can_move_left():
+            self.shift(-1, 0)
+            self.notify("move", -1, 0)
+
+    def drop_distance(self, blocks: list[list[int]]) -> int:
+        """
+        Returns how many rows the blocks can fall together before one of them
+        lands on the floor or an inactive block.
+        """
+        return min(self.board.drop_distance(b[0], b[1]) for b in blocks)
+
+    def ghost_blocks(self) -> list[list[int]]:
+        """
+        Returns the [x, y] positions the active blocks would stop at if they
+        fell straight down.
+        """
+        distance = self.drop_distance(self.active_blocks)
+        return [[x, y + distance] for x, y, _ in self.active_blocks]
+
+    def rotate(self) -> None:
+        """
+        Rotates the active shape by 90 degrees by looking up its next
+        orientation. If the rotated shape collides with a wall or inactive
+        blocks, it is moved by each offset in KICKS in turn and the rotation
+        does not occur if none of them fit.
+        """
+        if self.state_machine.state == "shape_moving":
+            orientation = (self.orientation + 1) % 4
+            for kick in KICKS:
+                if self.fits(orientation, self.shape_x + kick, self.shape_y):
+                    self.orientation = orientation
+                    self.shape_x += kick
+                    for b, (x, y) in zip(
+                        self.active_blocks, ORIENTATIONS[self.shape][orientation]
+                    ):
+                        b[0] = self.shape_x + x
+                        b[1] = self.shape_y + y
+                    self.notify("rotate")
+                    break
+
+    def spawn_shape(self) -> int:
+        """
+        Adds the next shape in the queue to the active blocks and returns it.
+        """
+        shape = self.shape_queue.pop(0)
+        self.shape = shape
+        self.orientation = 0
+        self.shape_x = self.center
+        self.shape_y = 0
+        for x, y in ORIENTATIONS[shape][0]:
+            self.active_blocks.append([x + self.center, y, shape])
+        self.shape_queue.append(self.random.randint(0, len(SHAPES) - 1))
+        self.pieces += 1
+        return shape
+
+    def deactivate_blocks(self) -> None:
+        """
+        Turns the active shape into inactive blocks once it has landed.
+        """
+        deactivated = list(range(len(self.active_blocks) - 1, -1, -1))
+        blocks = self.active_blocks[::-1]
+        for b in blocks:
+            self.board.place(*b)
+        self.active_blocks = []
+        self.shape = None
+        self.state_machine.set_state("clearing_rows")
+        self.notify("lock", deactivated, blocks)
+
+    def move_cascade_down(self) -> None:
+        """
+        Locks the falling clusters that have landed or, if none have, moves
+        every falling block down by one tile.
+        """
+        landed = self.cascade.get_landed(self.board, self.active_blocks)
+        if landed:
+            deactivated = self.cascade.remove(landed)
+            blocks = [self.active_blocks[i] for i in deactivated]
+            for i, b in zip(deactivated, blocks):
+                self.board.place(*b)
+                del self.active_blocks[i]
+            if len(self.active_blocks) == 0:
+                self.cascade = None
+            self.notify("lock", deactivated, blocks)
+        else:
+            self.shift(0, 1)
+            self.cascade.fall()
+            self.notify("move", 0, 1)
+
+    def settle_cascade(self) -> None:
+        """
+        Moves every falling block straight to where its cluster lands and
+        turns them all into inactive blocks.
+        """
+        for label, b in zip(self.cascade.labels, self.active_blocks):
+            b[1] += self.cascade.remaining[label]
+        self.notify("settle")
+        deactivated = list(range(len(self.active_blocks) - 1, -1, -1))
+        blocks = self.active_blocks[::-1]
+        for b in blocks:
+            self.board.place(*b)
+        self.active_blocks = []
+        self.cascade = None
+        self.notify("lock", deactivated, blocks)
+
+    def get_filled_rows(self) -> set[int]:
+        """
+        Returns a set of the row number of filled rows.
+        """
+        return self.board.get_filled_rows()
+
+    def delete_rows(self, rows_to_delete: set[int]) -> None:
+        """
+        Takes a set of rows and deletes the blocks in those rows.
+        Adds blocks above the lowest row deleted to the active blocks
+        and gives them the chance to cause more rows to be deleted after
+        they fall.
+
+        In instant_cascades mode the blocks land right away, and the rows
+        they fill are deleted in turn until no full rows are left.
+        """
+        if len(rows_to_delete) > 0:
+            lowest_row_deleted = max(rows_to_delete)
+            self.lines += len(rows_to_delete)
+            falling = []
+            for y in range(lowest_row_deleted, -1, -1):
+                for x in range(self.board.width):
+                    if self.board.is_occupied(x, y):
+                        shape = self.board.remove(x, y)
+                        if y not in rows_to_delete:
+                            self.active_blocks.append([x, y, shape])
+                            falling.append((x, y))
+            if len(self.active_blocks) > 0:
+                self.cascade = Cascade(self.board, self.active_blocks)
+            self.notify("clear", rows_to_delete, falling)
+            if self.instant_cascades and self.cascade:
+                self.settle_cascade()
+                self.delete_rows(self.get_filled_rows())
+
+    def reset(self, seed: int | None = None) -> None:
+        """
+        Empties the board and begins a new game. If a seed is given, the random
+        number generator and the queue start over from it, so that the new
+        game plays out like one in a new engine created with that seed.
+        """
+        if seed is not None:
+            self.seed = seed
+            self.random.seed(seed)
+            self.shape_queue = [
+                self.random.randint(0, len(SHAPES) - 1) for _ in range(QUEUE_LENGTH)
+            ]
+        self.active_blocks = []
+        self.shape = None
+        self.cascade = None
+        self.board.clear()
+        self.score = 0
+        self.lines = 0
+        self.pieces = 0
+        self.ticks = 0
+        self.state_machine.set_state("spawn_shape")
+        self.notify("reset")
+
+    def snapshot(self) -> Snapshot:
+        """
+        Returns an immutable copy of everything needed to continue the game
+        from where it is now, to be passed to restore later.
+        """
+        return Snapshot(
+            self.board.pack(),
+            self.board.hash,
+            tuple(map(tuple, self.active_blocks)),
+            self.shape,
+            self.orientation,
+            self.shape_x,
+            self.shape_y,
+            self.cascade.freeze() if self.cascade else None,
+            tuple(self.shape_queue),
+            self.random.getstate(),
+            self.state_machine.state,
+            self.state_machine.previous_state,
+            self.score,
+            self.lines,
+            self.pieces,
+            self.ticks,
+        )
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """
+        Puts the game back into the state it was in when snapshot was taken.
+        """
+        self.board.unpack(snapshot.board, snapshot.board_hash)
+        self.active_blocks = list(map(list, snapshot.active_blocks))
+        self.shape = snapshot.shape
+        self.orientation = snapshot.orientation
+        self.shape_x = snapshot.shape_x
+        self.shape_y = snapshot.shape_y
+        self.cascade = Cascade.thaw(snapshot.cascade) if snapshot.cascade else None
+        self.shape_queue = list(snapshot.shape_queue)
+        self.random.setstate(snapshot.random_state)
+        self.state_machine.state = snapshot.state
+        self.state_machine.previous_state = snapshot.previous_state
+        self.score = snapshot.score
+        self.lines = snapshot.lines
+        self.pieces = snapshot.pieces
+        self.ticks = snapshot.ticks
+        self.notify("restore")
+
+    def clone(self) -> "Engine":
+        """
+        Returns a new engine in the same state as this one, without listeners.
+        """
+        engine = Engine(
+            self.board.width,
+            self.board.height,
+            self.seed,
+            self.instant_cascades,
+        )
+        engine.restore(self.snapshot())
+        return engine
+
+    def toggle_pause(self) -> None:
+        """
+        Handles pausing and unpausing.
+        """
+        if self.state_machine.state == "paused":
+            self.state_machine.state = self.state_machine.previous_state
+            self.notify("pause", False)
+        elif self.state_machine.state != "game_over":
+            self.state_machine.set_state("paused")
+            self.notify("pause", True)
+
+    def tick(self) -> None:
+        """
+        Advances the game by one step of gravity.
+        """
+        if self.state_machine.state not in ("paused", "game_over"):
+            self.ticks += 1
+        if self.state_machine.state == "shape_moving":
+            self.move_shape_down()
+        elif self.state_machine.state == "clearing_rows":
+            if self.cascade:
+                self.move_cascade_down()
+            else:
+                rows_to_delete = self.get_filled_rows()
+                if len(rows_to_delete) > 0:
+                    self.delete_rows(rows_to_delete)
+                else:
+                    self.state_machine.set_state("spawn_shape")
+        elif self.state_machine.state == "spawn_shape":
+            self.spawn_shape()
+            if not self.fits(0, self.shape_x, self.shape_y):
+                self.state_machine.set_state("game_over")
+                self.notify("spawn")
+                self.notify("game_over")
+            else:
+                self.state_machine.set_state("shape_moving")
+                self.notify("spawn")
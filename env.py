@@ -0,0 +1,109 @@
+import numpy as np
+
+from engine import X_TILES, Y_TILES
+from vector_engine import DROP, VectorEngine
+
+NUM_ACTIONS = DROP + 1  # Actions are the codes NOTHING to DROP in vector_engine
+LINE_REWARD = 100  # The reward for each row deleted, on top of the score
+
+
+class VectorEnv:
+    """
+    A Gym style interface to many games at once for training agents, built
+    on VectorEngine. step takes one action code per game and returns
+    (observations, rewards, dones, info).
+
+    The reward for a step is how much the score went up, from soft and hard
+    drops as in Engine, plus line_reward for every row deleted.
+
+    Nothing returned is a copy. observations is a dict of the engine's own
+    arrays: "board" is VectorEngine.boards, and "shape", "orientation", "x",
+    "y" and "queue" describe the active and queued shapes. rewards, dones and
+    the arrays in info are preallocated and overwritten by every step, so
+    callers that keep them across steps need to copy them.
+
+    With auto_reset, games that end are started again within the same step,
+    so the observations are of the new games while dones is set for them and
+    info holds the final score and lines of the games that ended. Otherwise
+    finished games stay over, with a reward of 0, until reset is called.
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        width: int = X_TILES,
+        height: int = Y_TILES,
+        seed: int | None = None,
+        line_reward: float = LINE_REWARD,
+        auto_reset: bool = True,
+    ):
+        self.num_envs = num_envs
+        self.line_reward = line_reward
+        self.auto_reset = auto_reset
+        self.engine = VectorEngine(num_envs, width, height, seed)
+
+        engine = self.engine
+        self.observations = {
+            "board": engine.boards,
+            "shape": engine.shape,
+            "orientation": engine.orientation,
+            "x": engine.x,
+            "y": engine.y,
+            "queue": engine.queue,
+        }
+        self.rewards = np.zeros(num_envs, dtype=np.float64)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.previous_score = np.zeros(num_envs, dtype=np.int64)
+        self.previous_lines = np.zeros(num_envs, dtype=np.int64)
+        # Scratch space for step
+        self.score_gained = np.zeros(num_envs, dtype=np.int64)
+        self.lines_cleared = np.zeros(num_envs, dtype=np.int64)
+        self.final_score = np.zeros(num_envs, dtype=np.int64)
+        self.final_lines = np.zeros(num_envs, dtype=np.int64)
+        self.info = {
+            "score": engine.score,
+            "lines": engine.lines,
+            "ticks": engine.ticks,
+            "final_score": self.final_score,
+            "final_lines": self.final_lines,
+        }
+
+    def reset(self, seed: int | None = None, indices=None) -> dict[str, np.ndarray]:
+        """
+        Starts new games in the environments at the given indices, or in every
+        environment, and returns the observations. A seed restarts the random
+        number generator the shapes are drawn from.
+        """
+        if seed is not None:
+            self.engine.random = np.random.default_rng(seed)
+        self.engine.reset(indices)
+        if indices is None:
+            indices = slice(None)
+        self.previous_score[indices] = 0
+        self.previous_lines[indices] = 0
+        self.dones[indices] = False
+        return self.observations
+
+    def step(self, actions) -> tuple[dict, np.ndarray, np.ndarray, dict]:
+        """
+        Applies one action code per environment and one step of gravity.
+        """
+        engine = self.engine
+        engine.step(actions)
+
+        np.subtract(engine.score, self.previous_score, out=self.score_gained)
+        np.subtract(engine.lines, self.previous_lines, out=self.lines_cleared)
+        np.multiply(self.lines_cleared, self.line_reward, out=self.rewards)
+        np.add(self.rewards, self.score_gained, out=self.rewards)
+        np.copyto(self.previous_score, engine.score)
+        np.copyto(self.previous_lines, engine.lines)
+        np.copyto(self.dones, engine.game_over)
+
+        if self.auto_reset and self.dones.any():
+            finished = np.flatnonzero(self.dones)
+            self.final_score[finished] = engine.score[finished]
+            self.final_lines[finished] = engine.lines[finished]
+            engine.reset(finished)
+            self.previous_score[finished] = 0
+            self.previous_lines[finished] = 0
+        return self.observations, self.rewards, self.dones, self.info
@@ -0,0 +1,280 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+from engine import Engine
+from replay import read_varint, write_varint
+
+RING_CAPACITY = 10_000  # The number of recent events RingBuffer keeps
+BATCH_SIZE = 256  # The number of events FileSink writes at once
+FLUSH_INTERVAL = 1.0  # The most seconds an event waits before FileSink writes it
+EVENTS_MAGIC = b"TTEV"  # The bytes every binary event file starts with
+EVENTS_VERSION = 1  # The version of the binary event format
+
+
+class GameStarted(NamedTuple):
+    tick: int
+    seed: int | None
+
+
+class PieceSpawned(NamedTuple):
+    tick: int
+    shape: int
+    queue: tuple[int, ...]  # The shapes queued after it
+
+
+class PieceLocked(NamedTuple):
+    tick: int
+    shape: int
+    cells: tuple[tuple[int, int], ...]  # The (x, y) tiles it locked into
+    drop_distance: int  # The rows it fell from where it spawned
+
+
+class RowsCleared(NamedTuple):
+    tick: int
+    rows: tuple[int, ...]
+
+
+class ScoreChanged(NamedTuple):
+    tick: int
+    score: int
+    gained: int
+
+
+class GameOver(NamedTuple):
+    tick: int
+    score: int
+    lines: int
+    pieces: int
+
+
+# Every event type, indexed by its code in the binary format
+EVENT_TYPES = (
+    GameStarted,
+    PieceSpawned,
+    PieceLocked,
+    RowsCleared,
+    ScoreChanged,
+    GameOver,
+)
+# The names of the event types in JSON lines
+EVENT_NAMES = {
+    GameStarted: "game_started",
+    PieceSpawned: "piece_spawned",
+    PieceLocked: "piece_locked",
+    RowsCleared: "rows_cleared",
+    ScoreChanged: "score_changed",
+    GameOver: "game_over",
+}
+
+
+class EventBus:
+    """
+    Turns the events of an engine into the typed events above and passes
+    each one to every sink, a callable that takes the event. Sinks are called
+    from the game loop, so they should only store the event and return.
+
+    Only the active shape locking is a PieceLocked; blocks landing after rows
+    were deleted are not. Events hold only immutable values, so sinks can
+    hand them to other threads. A GameStarted is published to the sinks
+    given here if the engine has not spawned a shape yet, and on every reset.
+    """
+
+    def __init__(self, engine: Engine, sinks=()):
+        self.engine = engine
+        self.sinks = list(sinks)
+        self.score = engine.score
+        self.spawn_y = None  # The y the active shape spawned at, while it moves
+        engine.add_listener(self)
+        if engine.pieces == 0:
+            self.publish(GameStarted(engine.ticks, engine.seed))
+
+    def add_sink(self, sink) -> None:
+        self.sinks.append(sink)
+
+    def publish(self, event: NamedTuple) -> None:
+        for sink in self.sinks:
+            sink(event)
+
+    def __call__(self, event: str, *args) -> None:
+        engine = self.engine
+        if event == "spawn":
+            self.spawn_y = engine.shape_y
+            self.publish(
+                PieceSpawned(engine.ticks, engine.shape, tuple(engine.shape_queue))
+            )
+        elif event == "lock" and self.spawn_y is not None:
+            blocks = args[1]
+            self.publish(
+                PieceLocked(
+                    engine.ticks,
+                    blocks[0][2],
+                    tuple((x, y) for x, y, _ in reversed(blocks)),
+                    # The shape's tile was moved along with it until it locked
+                    engine.shape_y - self.spawn_y,
+                )
+            )
+            self.spawn_y = None
+        elif event == "clear":
+            self.publish(RowsCleared(engine.ticks, tuple(sorted(args[0]))))
+        elif event == "score":
+            self.publish(ScoreChanged(engine.ticks, args[0], args[0] - self.score))
+            self.score = args[0]
+        elif event == "game_over":
+            self.spawn_y = None
+            self.publish(
+                GameOver(engine.ticks, engine.score, engine.lines, engine.pieces)
+            )
+        elif event in ("reset", "restore"):
+            self.score = engine.score
+            self.spawn_y = engine.shape_y if engine.shape is not None else None
+            if event == "reset":
+                self.publish(GameStarted(engine.ticks, engine.seed))
+
+
+class RingBuffer:
+    """
+    A sink that keeps the most recent capacity events in memory.
+    """
+
+    def __init__(self, capacity: int = RING_CAPACITY):
+        self.events = deque(maxlen=capacity)
+
+    def __call__(self, event: NamedTuple) -> None:
+        self.events.append(event)
+
+
+def encode_json(event: NamedTuple) -> str:
+    return json.dumps({"type": EVENT_NAMES[type(event)], **event._asdict()})
+
+
+def encode_binary(out: bytearray, event: NamedTuple) -> None:
+    """
+    Appends an event to out as the index of its type in EVENT_TYPES
+    followed by its fields as varints. Tuples are written as their length
+    followed by their items, with (x, y) pairs flattened, and fields that
+    may be None are written as one more than their value, or 0 for None.
+    """
+    out.append(EVENT_TYPES.index(type(event)))
+    for value, annotation in zip(event, type(event).__annotations__.values()):
+        if annotation == int | None:
+            write_varint(out, 0 if value is None else value + 1)
+        elif isinstance(value, tuple):
+            write_varint(out, len(value))
+            for item in value:
+                if isinstance(item, tuple):
+                    for number in item:
+                        write_varint(out, number)
+                else:
+                    write_varint(out, item)
+        else:
+            write_varint(out, value)
+
+
+def decode_binary(data: bytes) -> list[NamedTuple]:
+    """
+    Reads the events of a file written by FileSink in the binary format.
+    """
+    if data[: len(EVENTS_MAGIC)] != EVENTS_MAGIC:
+        raise ValueError("Not an event file")
+    if data[len(EVENTS_MAGIC)] != EVENTS_VERSION:
+        raise ValueError(f"Unsupported event file version {data[len(EVENTS_MAGIC)]}")
+    pos = len(EVENTS_MAGIC) + 1
+    events = []
+    while pos < len(data):
+        event_type = EVENT_TYPES[data[pos]]
+        pos += 1
+        fields = []
+        for annotation in event_type.__annotations__.values():
+            if annotation is int:
+                value, pos = read_varint(data, pos)
+            elif annotation == int | None:
+                value, pos = read_varint(data, pos)
+                value = value - 1 if value else None
+            else:
+                length, pos = read_varint(data, pos)
+                pairs = annotation == tuple[tuple[int, int], ...]
+                items = []
+                for _ in range(length):
+                    if pairs:
+                        x, pos = read_varint(data, pos)
+                        y, pos = read_varint(data, pos)
+                        items.append((x, y))
+                    else:
+                        item, pos = read_varint(data, pos)
+                        items.append(item)
+                value = tuple(items)
+            fields.append(value)
+        events.append(event_type(*fields))
+    return events
+
+
+class FileSink:
+    """
+    A sink that writes events to a file as JSON lines, or in a compact
+    binary format if binary is set. Calls only put the event on a queue: a
+    background thread encodes and writes them in batches of batch_size, or
+    whatever has arrived flush_interval seconds after the first event of a
+    batch, so the game loop never waits for the disk. close writes what is
+    left and stops the thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        binary: bool = False,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.binary = binary
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.file = open(path, "wb")
+        if binary:
+            self.file.write(EVENTS_MAGIC + bytes([EVENTS_VERSION]))
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def __call__(self, event: NamedTuple) -> None:
+        self.queue.put(event)
+
+    def write_loop(self) -> None:
+        closing = False
+        while not closing:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                # close puts None on the queue once every event is ahead of it
+                batch.pop()
+                closing = True
+            if batch:
+                self.write(batch)
+
+    def write(self, batch: list[NamedTuple]) -> None:
+        if self.binary:
+            out = bytearray()
+            for event in batch:
+                encode_binary(out, event)
+            self.file.write(out)
+        else:
+            self.file.write(
+                "".join(encode_json(event) + "\n" for event in batch).encode()
+            )
+        self.file.flush()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
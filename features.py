@@ -0,0 +1,161 @@
+from array import array
+
+from engine import Engine
+
+# Indices of the totals in FeatureTracker.features
+AGGREGATE_HEIGHT = 0  # The sum of the heights of every column
+HOLES = 1  # The number of empty tiles with a block somewhere above them
+BUMPINESS = 2  # The sum of the height differences between neighboring columns
+WELL_DEPTH = 3  # The sum of how far each column is below both of its neighbors
+ROW_TRANSITIONS = 4  # The number of changes between filled and empty along rows
+ALMOST_FULL_ROWS = 5  # The number of rows with exactly one empty tile
+NUM_TOTALS = 6  # The number of totals, which are followed by per column features
+TOTAL_NAMES = (
+    "aggregate_height",
+    "holes",
+    "bumpiness",
+    "well_depth",
+    "row_transitions",
+    "almost_full_rows",
+)
+
+
+class FeatureTracker:
+    """
+    Keeps features of an engine's board up to date as blocks lock and rows
+    are deleted, for evaluators and analytics. Only the columns and rows a
+    change touches are looked at again: a lock updates the columns and rows
+    of its blocks, and deleting rows updates the rows above the lowest one.
+
+    features is a flat array of the totals, at the indices named above,
+    followed by the height of each column starting at heights_offset, the
+    holes in each column starting at holes_offset and the well depth of each
+    column starting at wells_offset. It is updated in place.
+
+    Walls count as filled for row transitions and as infinitely high for
+    wells. Empty rows have no transitions.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.width = engine.board.width
+        self.height = engine.board.height
+        self.heights_offset = NUM_TOTALS
+        self.holes_offset = NUM_TOTALS + self.width
+        self.wells_offset = NUM_TOTALS + 2 * self.width
+        self.features = array("i", bytes(4 * (NUM_TOTALS + 3 * self.width)))
+        # Occupancy of every column as a bitmask where bit y is tile (x, y)
+        self.columns = [0] * self.width
+        # The height difference between each column and the one to its right
+        self.bumps = [0] * (self.width - 1)
+        self.row_transitions = [0] * self.height
+        self.almost_full = [False] * self.height
+        self.rebuild(self.height - 1)
+        engine.add_listener(self)
+
+    def __call__(self, event: str, *args) -> None:
+        if event == "lock":
+            self.add_blocks(args[1])
+        elif event == "clear":
+            self.rebuild(max(args[0]))
+        elif event in ("reset", "restore"):
+            self.rebuild(self.height - 1)
+
+    def add_blocks(self, blocks: list[list[int]]) -> None:
+        """
+        Updates the features after the blocks were placed on the board.
+        """
+        columns = set()
+        rows = set()
+        for x, y, _ in blocks:
+            self.columns[x] |= 1 << y
+            columns.add(x)
+            rows.add(y)
+        for y in rows:
+            self.update_row(y)
+        self.update_columns(columns)
+
+    def rebuild(self, last_row: int) -> None:
+        """
+        Reads the rows of the board down to last_row again, after the rows
+        there changed in ways other than blocks being added.
+        """
+        rows = self.engine.board.rows
+        kept = ~((1 << (last_row + 1)) - 1)
+        self.columns = [column & kept for column in self.columns]
+        for y in range(last_row + 1):
+            mask = rows[y]
+            while mask:
+                bit = mask & -mask
+                self.columns[bit.bit_length() - 1] |= 1 << y
+                mask ^= bit
+            self.update_row(y)
+        self.update_columns(range(self.width))
+
+    def update_row(self, y: int) -> None:
+        features = self.features
+        mask = self.engine.board.rows[y]
+        if mask:
+            walled = mask << 1 | 1 | 1 << (self.width + 1)
+            transitions = ((walled ^ walled >> 1) & ((2 << self.width) - 1)).bit_count()
+        else:
+            transitions = 0
+        features[ROW_TRANSITIONS] += transitions - self.row_transitions[y]
+        self.row_transitions[y] = transitions
+        almost_full = mask.bit_count() == self.width - 1
+        features[ALMOST_FULL_ROWS] += almost_full - self.almost_full[y]
+        self.almost_full[y] = almost_full
+
+    def update_columns(self, columns) -> None:
+        """
+        Updates the heights and holes of the given columns, and the bumpiness
+        and wells around them.
+        """
+        features = self.features
+        heights_offset = self.heights_offset
+        neighbors = set()
+        for x in columns:
+            column = self.columns[x]
+            if column:
+                height = self.height - ((column & -column).bit_length() - 1)
+                holes = height - column.bit_count()
+            else:
+                height = holes = 0
+            features[AGGREGATE_HEIGHT] += height - features[heights_offset + x]
+            features[heights_offset + x] = height
+            features[HOLES] += holes - features[self.holes_offset + x]
+            features[self.holes_offset + x] = holes
+            neighbors.update((x - 1, x, x + 1))
+
+        for x in neighbors:
+            if 0 <= x < self.width - 1:
+                bump = abs(
+                    features[heights_offset + x] - features[heights_offset + x + 1]
+                )
+                features[BUMPINESS] += bump - self.bumps[x]
+                self.bumps[x] = bump
+        for x in neighbors:
+            if 0 <= x < self.width:
+                left = features[heights_offset + x - 1] if x > 0 else self.height
+                right = (
+                    features[heights_offset + x + 1]
+                    if x < self.width - 1
+                    else self.height
+                )
+                depth = max(0, min(left, right) - features[heights_offset + x])
+                features[WELL_DEPTH] += depth - features[self.wells_offset + x]
+                features[self.wells_offset + x] = depth
+
+    def as_dict(self) -> dict[str, int | list[int]]:
+        """
+        Returns the features by name, for reports.
+        """
+        features = self.features
+        result = {name: features[i] for i, name in enumerate(TOTAL_NAMES)}
+        for name, offset in (
+            ("heights", self.heights_offset),
+            ("column_holes", self.holes_offset),
+            ("wells", self.wells_offset),
+        ):
+            result[name] = features[offset : offset + self.width].tolist()
+        return result
@@ -0,0 +1,132 @@
+import sys
+from abc import ABC, abstractmethod
+
+from engine import Engine
+
+# The 256 color palette index of each shape in the terminal
+TERMINAL_COLORS = [196, 46, 21, 226, 208, 129, 51]
+ESCAPE = "\x1b["  # The start of every ANSI control sequence
+RESET = ESCAPE + "0m"  # Puts colors back to the terminal's defaults
+EMPTY_CELL = RESET + " ."  # How an empty tile is drawn, two characters wide
+
+
+class Renderer(ABC):
+    """
+    Draws an engine. render is called once per frame and brings the display
+    up to date with the engine, and close is called when the game ends.
+    Backends must implement render.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    @abstractmethod
+    def render(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class NullRenderer(Renderer):
+    """
+    Draws nothing, for running the game loop without a display.
+    """
+
+    def render(self) -> None:
+        pass
+
+
+class TerminalRenderer(Renderer):
+    """
+    Draws an engine in a terminal with ANSI escape codes, two characters per
+    tile, to stream or sys.stdout. What was drawn is remembered, so each render only writes the tiles
+    and status text that changed since the last one.
+    """
+
+    def __init__(self, engine: Engine, stream=None):
+        super().__init__(engine)
+        # Looked up here rather than as the default so that redirects apply
+        self.stream = stream or sys.stdout
+        self.width = engine.board.width
+        self.height = engine.board.height
+        # What is currently drawn in each tile, or None before the first render
+        self.drawn_tiles = None
+        self.drawn_status = None
+
+    @staticmethod
+    def move_to(column: int, row: int) -> str:
+        return f"{ESCAPE}{row};{column}H"
+
+    def tile_position(self, x: int, y: int) -> str:
+        # The board starts below the top border and right of the left wall
+        return self.move_to(2 * x + 2, y + 2)
+
+    def get_tiles(self) -> list[str]:
+        """
+        Returns what each tile of the board should show, row by row.
+        """
+        engine = self.engine
+        width = self.width
+        tiles = [
+            f"{ESCAPE}48;5;{TERMINAL_COLORS[code - 1]}m  " if code else EMPTY_CELL
+            for code in engine.board.cells
+        ]
+        if engine.state_machine.state == "shape_moving":
+            for x, y in engine.ghost_blocks():
+                tiles[y * width + x] = (
+                    f"{RESET}{ESCAPE}38;5;{TERMINAL_COLORS[engine.shape]}m[]"
+                )
+        for x, y, shape in engine.active_blocks:
+            if 0 <= x < width and 0 <= y < self.height:
+                tiles[y * width + x] = f"{ESCAPE}48;5;{TERMINAL_COLORS[shape]}m  "
+        return tiles
+
+    def get_status(self) -> str:
+        engine = self.engine
+        status = (
+            f"Score: {engine.score}  Level: {engine.get_level()}  "
+            f"Lines: {engine.lines}"
+        )
+        if engine.is_game_over():
+            status += "  Game over!"
+        elif engine.state_machine.state == "paused":
+            status += "  Paused"
+        return status
+
+    def draw_border(self) -> str:
+        horizontal = "+" + "-" * (2 * self.width) + "+"
+        out = [ESCAPE + "2J", ESCAPE + "?25l", self.move_to(1, 1), horizontal]
+        for y in range(self.height):
+            out.append(self.move_to(1, y + 2) + "|")
+            out.append(self.move_to(2 * self.width + 2, y + 2) + "|")
+        out.append(self.move_to(1, self.height + 2) + horizontal)
+        return "".join(out)
+
+    def render(self) -> None:
+        out = []
+        if self.drawn_tiles is None:
+            out.append(self.draw_border())
+            self.drawn_tiles = [None] * (self.width * self.height)
+        drawn = self.drawn_tiles
+        for i, tile in enumerate(self.get_tiles()):
+            if tile != drawn[i]:
+                out.append(self.tile_position(i % self.width, i // self.width))
+                out.append(tile)
+                drawn[i] = tile
+        status = self.get_status()
+        if status != self.drawn_status:
+            self.drawn_status = status
+            out.append(RESET + self.move_to(1, self.height + 3) + ESCAPE + "2K")
+            out.append(status)
+        if out:
+            out.append(RESET)
+            self.stream.write("".join(out))
+            self.stream.flush()
+
+    def close(self) -> None:
+        """
+        Shows the cursor again and leaves it below the board.
+        """
+        self.stream.write(RESET + self.move_to(1, self.height + 4) + ESCAPE + "?25h")
+        self.stream.flush()
@@ -0,0 +1,242 @@
+import argparse
+import bisect
+
+from engine import ACTIONS, Engine
+
+MAGIC = b"TTRP"  # The bytes every replay file starts with
+VERSION = 2  # The version of the replay format written by Replay.to_bytes
+END = 7  # The action code that marks the end of the input stream
+KEYFRAME_INTERVAL = 500  # The number of ticks between keyframes in ReplayPlayer
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    """
+    Appends a non-negative integer to out in 7 bit groups, lowest first, with
+    the top bit of each byte set if more bytes follow.
+    """
+    if value < 0:
+        raise ValueError(f"Cannot encode negative value {value}")
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """
+    Reads an integer written by write_varint at pos and returns it together
+    with the position of the byte after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Replay ends in the middle of a number")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Replay:
+    """
+    Everything needed to play a game again: the seed and board size it was
+    played with and every action applied to it, stamped with the tick count
+    of the engine at the time. final_tick is the tick the recording ended on.
+
+    In the binary format the header is followed by one number per action
+    holding the ticks since the previous action shifted left by three bits,
+    with the index of the action in ACTIONS in the low bits. Most inputs take
+    one or two bytes. The stream ends with the END code and the ticks from
+    the last action to final_tick.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        width: int,
+        height: int,
+        inputs: list[tuple[int, str]],
+        final_tick: int,
+    ):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.inputs = inputs
+        self.final_tick = final_tick
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        for value in (self.seed, self.width, self.height):
+            write_varint(out, value)
+        last_tick = 0
+        for tick, action in self.inputs:
+            write_varint(out, (tick - last_tick) << 3 | ACTIONS.index(action))
+            last_tick = tick
+        write_varint(out, (self.final_tick - last_tick) << 3 | END)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Replay":
+        if data[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a replay")
+        if data[len(MAGIC)] != VERSION:
+            raise ValueError(f"Unsupported replay version {data[len(MAGIC)]}")
+        pos = len(MAGIC) + 1
+        seed, pos = read_varint(data, pos)
+        width, pos = read_varint(data, pos)
+        height, pos = read_varint(data, pos)
+        inputs = []
+        tick = 0
+        while True:
+            value, pos = read_varint(data, pos)
+            tick += value >> 3
+            code = value & 7
+            if code == END:
+                return cls(seed, width, height, inputs, tick)
+            if code >= len(ACTIONS):
+                raise ValueError(f"Unknown action code {code}")
+            inputs.append((tick, ACTIONS[code]))
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def parse_seed(text: str) -> int:
+    """
+    Reads a seed given on the command line. Replays and binary event files
+    store seeds as varints, so negative seeds are rejected.
+    """
+    seed = int(text)
+    if seed < 0:
+        raise argparse.ArgumentTypeError(f"seeds cannot be negative: {seed}")
+    return seed
+
+
+class Recorder:
+    """
+    Records the actions applied to an engine as a listener. The recording
+    starts over whenever the engine is reset. Actions applied while the game
+    is paused do nothing, so they are left out.
+    """
+
+    def __init__(self, engine: Engine):
+        if engine.seed is None or engine.seed < 0:
+            raise ValueError(
+                "Only engines created with a non-negative seed can be recorded"
+            )
+        self.engine = engine
+        self.seed = engine.seed
+        self.inputs = []
+        engine.add_listener(self)
+
+    def __call__(self, event: str, *args) -> None:
+        if event == "input":
+            if self.engine.state_machine.state != "paused":
+                self.inputs.append((self.engine.ticks, args[0]))
+        elif event == "reset":
+            self.seed = self.engine.seed
+            self.inputs = []
+
+    def get_replay(self) -> Replay:
+        """
+        Returns the game recorded so far.
+        """
+        return Replay(
+            self.seed,
+            self.engine.board.width,
+            self.engine.board.height,
+            list(self.inputs),
+            self.engine.ticks,
+        )
+
+
+class ReplayPlayer:
+    """
+    Plays a replay back on a headless engine as fast as possible. A snapshot
+    of the engine is kept every keyframe_interval ticks, so that seeking to
+    an earlier tick only replays the ticks since the keyframe before it.
+
+    The engine is at tick t once t ticks have run and before the actions
+    stamped with t have been applied.
+    """
+
+    def __init__(self, replay: Replay, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.replay = replay
+        self.keyframe_interval = keyframe_interval
+        self.engine = Engine(replay.width, replay.height, seed=replay.seed)
+        self.index = 0  # The index of the next input to apply
+        # (tick, index, snapshot) for every keyframe, in tick order
+        self.keyframes = [(0, 0, self.engine.snapshot())]
+
+    def apply_due_inputs(self) -> None:
+        """
+        Applies the actions stamped with the engine's current tick.
+        """
+        inputs = self.replay.inputs
+        while self.index < len(inputs) and inputs[self.index][0] <= self.engine.ticks:
+            self.engine.apply(inputs[self.index][1])
+            self.index += 1
+
+    def seek(self, tick: int) -> Engine:
+        """
+        Moves the engine to the given tick, or as close as the game gets to it,
+        and returns it.
+        """
+        tick = min(tick, self.replay.final_tick)
+        i = bisect.bisect_right(self.keyframes, tick, key=lambda keyframe: keyframe[0])
+        keyframe_tick, index, snapshot = self.keyframes[i - 1]
+        if tick < self.engine.ticks or keyframe_tick > self.engine.ticks:
+            self.engine.restore(snapshot)
+            self.index = index
+        while self.engine.ticks < tick and not self.engine.is_game_over():
+            self.apply_due_inputs()
+            self.engine.tick()
+            if (
+                self.engine.ticks % self.keyframe_interval == 0
+                and self.engine.ticks > self.keyframes[-1][0]
+            ):
+                self.keyframes.append(
+                    (self.engine.ticks, self.index, self.engine.snapshot())
+                )
+        return self.engine
+
+    def play(self) -> Engine:
+        """
+        Plays the replay to its end and returns the engine.
+        """
+        self.seek(self.replay.final_tick)
+        if not self.engine.is_game_over():
+            self.apply_due_inputs()
+        return self.engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back recorded games.")
+    parser.add_argument("files", nargs="+", help="the replay files to play")
+    parser.add_argument("--tick", type=int, help="stop at this tick")
+    args = parser.parse_args()
+
+    for path in args.files:
+        player = ReplayPlayer(Replay.load(path))
+        if args.tick is None:
+            engine = player.play()
+        else:
+            engine = player.seek(args.tick)
+        print(
+            f"{path}: score {engine.score}, lines {engine.lines}, "
+            f"pieces {engine.pieces}, ticks {engine.ticks}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import time
+from collections import deque
+
+STATS_WINDOW = 120  # The number of recent frames that stats are computed over
+
+
+class FixedTimestep:
+    """
+    Decides how many logic ticks to run on each rendered frame so that the
+    game advances at tick_interval seconds per tick no matter how often, or
+    how late, frames are drawn.
+
+    Elapsed time is added to an accumulator and every full tick_interval in
+    it is spent on one tick. If a frame ran so late that more than
+    max_ticks_per_frame ticks are owed, the extra ticks are skipped rather
+    than run back to back, so that one slow frame does not cause a burst.
+    """
+
+    def __init__(
+        self,
+        tick_interval: float,
+        max_ticks_per_frame: int = 5,
+        clock=time.perf_counter,
+    ):
+        self.tick_interval = tick_interval
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.clock = clock
+        self.accumulator = 0.0
+        self.last_frame = None
+        self.frame_start = None
+
+        self.frames = 0
+        self.ticks = 0
+        self.skipped_ticks = 0
+        # Seconds between consecutive frames
+        self.frame_times = deque(maxlen=STATS_WINDOW)
+        # Seconds each frame took to process, as reported by end_frame
+        self.work_times = deque(maxlen=STATS_WINDOW)
+        # Seconds by which each frame's last tick ran after its ideal time
+        self.tick_jitter = deque(maxlen=STATS_WINDOW)
+
+    def advance(self) -> int:
+        """
+        Starts a frame and returns the number of ticks to run in it.
+        """
+        now = self.clock()
+        self.frame_start = now
+        if self.last_frame is None:
+            self.last_frame = now
+        self.frame_times.append(now - self.last_frame)
+        self.accumulator += now - self.last_frame
+        self.last_frame = now
+        self.frames += 1
+
+        # The tolerance stops rounding errors from holding a tick back a frame
+        ticks = int((self.accumulator + 1e-9) // self.tick_interval)
+        if ticks > self.max_ticks_per_frame:
+            self.skipped_ticks += ticks - self.max_ticks_per_frame
+            self.accumulator -= (ticks - self.max_ticks_per_frame) * self.tick_interval
+            ticks = self.max_ticks_per_frame
+        self.accumulator -= ticks * self.tick_interval
+        if ticks > 0:
+            self.tick_jitter.append(max(self.accumulator, 0.0))
+        self.ticks += ticks
+        return ticks
+
+    def end_frame(self) -> float:
+        """
+        Records how long the current frame took to process and returns it.
+        """
+        work_time = self.clock() - self.frame_start
+        self.work_times.append(work_time)
+        return work_time
+
+    def stats(self) -> dict[str, float]:
+        """
+        Returns frame and tick timing over the most recent frames, with times
+        in milliseconds.
+        """
+
+        def mean(values):
+            return 1000 * sum(values) / len(values) if values else 0.0
+
+        def peak(values):
+            return 1000 * max(values) if values else 0.0
+
+        frame_time = mean(self.frame_times)
+        return {
+            "frames": self.frames,
+            "ticks": self.ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "fps": 1000 / frame_time if frame_time else 0.0,
+            "frame_time_mean_ms": frame_time,
+            "frame_time_max_ms": peak(self.frame_times),
+            "work_time_mean_ms": mean(self.work_times),
+            "work_time_max_ms": peak(self.work_times),
+            "tick_jitter_mean_ms": mean(self.tick_jitter),
+            "tick_jitter_max_ms": peak(self.tick_jitter),
+        }
@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import random
+
+from engine import X_TILES, Y_TILES, Engine
+from replay import parse_seed
+
+MAX_LINE = 64  # The longest input line a client may send, in bytes
+MAX_OUTBOX = 100  # The most replies kept for a client before more are dropped
+SLOW_CLIENT_TIMEOUT = 5.0  # The seconds a client may take to accept an update
+BACKLOG = 1024  # The most connections waiting to be accepted at once
+MAX_LATE_TICKS = 5  # The most ticks run back to back to catch up after a stall
+CLIENT_INPUT_INTERVAL = 0.1  # The seconds between inputs of random_client
+
+
+class Session:
+    """
+    One game played over a connection. The client sends one input per line:
+    left, right, rotate, down, drop, pause, reset (after a game over),
+    stats or quit. The server sends one message per line:
+
+    hello <seed> <width> <height>: sent once the game has started
+    delta <tick> <score> <lines> <index>:<code> ...: the tiles that changed
+        since the last delta, by index row by row, with code 0 for an empty
+        tile or one more than the shape of the block in it, active or not
+    queue <shape> ...: the shapes in the queue, whenever it changes
+    over <score> <lines>: the game ended, reset starts a new one
+    stats <name>=<value> ...: the metrics of the session, when asked for
+    error <message>: an input was not understood
+
+    Gravity runs in its own task at the session's level, and updates are
+    written by another task that waits for the client to accept each write
+    before building the next delta. Changes made while a slow client is
+    catching up are merged into one delta, so what is buffered for a client
+    does not grow with how far behind it is. Clients that do not accept a
+    write within SLOW_CLIENT_TIMEOUT are disconnected. Replies, such as
+    hello, come before the queue and delta lines sent with them, and what is
+    left to send when the client quits is sent before the connection closes.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        seed: int,
+        width: int = X_TILES,
+        height: int = Y_TILES,
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.engine = Engine(width, height, seed=seed)
+        self.engine.add_listener(self.on_engine_event)
+        self.changed = asyncio.Event()
+        self.outbox = [f"hello {seed} {width} {height}"]
+        # What the client was last sent
+        self.sent_tiles = bytearray(width * height)
+        self.sent_queue = None
+        self.metrics = {
+            "games": 1,
+            "inputs": 0,
+            "ticks": 0,
+            "updates": 0,  # Changes to the game, including merged ones
+            "deltas": 0,
+            "bytes": 0,
+            "max_drain_ms": 0.0,  # The longest wait for the client to accept a write
+            "timed_out": 0,  # 1 if the client was dropped for being too slow
+            "dropped_replies": 0,  # Replies not sent because too many were waiting
+        }
+
+    def on_engine_event(self, event: str, *args) -> None:
+        if event == "game_over":
+            self.reply(f"over {self.engine.score} {self.engine.lines}")
+        self.metrics["updates"] += 1
+        self.changed.set()
+
+    def reply(self, line: str) -> None:
+        """
+        Queues a line to send with the next update, unless a client that is
+        not reading already has MAX_OUTBOX of them waiting.
+        """
+        if len(self.outbox) < MAX_OUTBOX:
+            self.outbox.append(line)
+            self.changed.set()
+        else:
+            self.metrics["dropped_replies"] += 1
+
+    async def run(self) -> None:
+        """
+        Plays the game until the client quits or disconnects.
+        """
+        self.changed.set()
+        tasks = [
+            asyncio.create_task(self.tick_loop()),
+            asyncio.create_task(self.send_loop()),
+        ]
+        try:
+            while True:
+                try:
+                    line = await self.reader.readline()
+                except ValueError:
+                    self.reply(f"error input longer than {MAX_LINE} bytes")
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if not self.handle_input(line.decode(errors="replace").strip()):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if not self.metrics["timed_out"] and not self.writer.is_closing():
+                await self.flush()
+            self.writer.close()
+
+    def handle_input(self, line: str) -> bool:
+        """
+        Applies one input line and returns False if the session should end.
+        """
+        self.metrics["inputs"] += 1
+        if line in self.engine.actions:
+            self.engine.apply(line)
+        elif line == "pause":
+            self.engine.toggle_pause()
+        elif line == "reset":
+            if self.engine.is_game_over():
+                self.engine.reset(random.randrange(2**32))
+                self.metrics["games"] += 1
+                board = self.engine.board
+                self.reply(f"hello {self.engine.seed} {board.width} {board.height}")
+        elif line == "stats":
+            self.reply(
+                "stats "
+                + " ".join(f"{name}={value}" for name, value in self.metrics.items())
+            )
+        elif line == "quit":
+            return False
+        elif line:
+            self.reply(f"error unknown input {line!r}")
+        return True
+
+    async def tick_loop(self) -> None:
+        """
+        Runs a step of gravity every tick interval of the engine's level.
+        """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            interval = self.engine.get_tick_interval()
+            next_tick = max(
+                next_tick + interval, loop.time() - MAX_LATE_TICKS * interval
+            )
+            await asyncio.sleep(next_tick - loop.time())
+            self.engine.tick()
+            self.metrics["ticks"] += 1
+
+    def get_updates(self) -> list[str]:
+        """
+        Returns the lines to send to bring the client up to date, and takes
+        what they describe as sent.
+        """
+        engine = self.engine
+        width = engine.board.width
+        lines = []
+
+        tiles = bytearray(engine.board.cells)
+        for x, y, shape in engine.active_blocks:
+            if 0 <= x < width and 0 <= y < engine.board.height:
+                tiles[y * width + x] = shape + 1
+        if tiles != self.sent_tiles:
+            changes = " ".join(
+                f"{i}:{code}"
+                for i, (code, sent) in enumerate(zip(tiles, self.sent_tiles))
+                if code != sent
+            )
+            lines.append(
+                f"delta {engine.ticks} {engine.score} {engine.lines} {changes}"
+            )
+            self.sent_tiles = tiles
+            self.metrics["deltas"] += 1
+        queue = tuple(engine.shape_queue)
+        if queue != self.sent_queue:
+            lines.insert(0, "queue " + " ".join(map(str, queue)))
+            self.sent_queue = queue
+        lines[:0] = self.outbox
+        self.outbox = []
+        return lines
+
+    async def flush(self) -> bool:
+        """
+        Writes the updates and waits for the client to accept them. Returns
+        False if the client was dropped for taking too long or is gone.
+        """
+        lines = self.get_updates()
+        if not lines:
+            return True
+        data = ("\n".join(lines) + "\n").encode()
+        self.writer.write(data)
+        self.metrics["bytes"] += len(data)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            async with asyncio.timeout(SLOW_CLIENT_TIMEOUT):
+                await self.writer.drain()
+        except TimeoutError:
+            # Dropping the connection ends the read loop in run as well
+            self.metrics["timed_out"] = 1
+            self.writer.transport.abort()
+            return False
+        except ConnectionError:
+            return False
+        drain_ms = 1000 * (loop.time() - start)
+        if drain_ms > self.metrics["max_drain_ms"]:
+            self.metrics["max_drain_ms"] = drain_ms
+        return True
+
+    async def send_loop(self) -> None:
+        """
+        Writes the updates whenever the game changes, one write at a time.
+        """
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            if not await self.flush():
+                return
+
+
+class Server:
+    """
+    Hosts a Session for every client that connects, all in one event loop.
+    Games are seeded with first_seed, first_seed + 1, ... in the order
+    clients connect, or with random seeds.
+    """
+
+    def __init__(
+        self,
+        width: int = X_TILES,
+        height: int = Y_TILES,
+        first_seed: int | None = None,
+    ):
+        self.width = width
+        self.height = height
+        self.next_seed = first_seed
+        self.sessions = set()
+        self.finished = 0
+        self.totals = {}  # The metrics of finished sessions added together
+
+    def get_seed(self) -> int:
+        if self.next_seed is None:
+            return random.randrange(2**32)
+        seed = self.next_seed
+        self.next_seed += 1
+        return seed
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        session = Session(reader, writer, self.get_seed(), self.width, self.height)
+        self.sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+            self.finished += 1
+            for name, value in session.metrics.items():
+                if name == "max_drain_ms":
+                    self.totals[name] = max(self.totals.get(name, 0.0), value)
+                else:
+                    self.totals[name] = self.totals.get(name, 0) + value
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, path: str | None = None
+    ) -> asyncio.Server:
+        """
+        Starts listening on a TCP port, or on a Unix socket if a path is given.
+        """
+        if path:
+            return await asyncio.start_unix_server(
+                self.handle, path, limit=MAX_LINE, backlog=BACKLOG
+            )
+        return await asyncio.start_server(
+            self.handle, host, port, limit=MAX_LINE, backlog=BACKLOG
+        )
+
+    def metrics(self) -> dict:
+        """
+        Returns the number of open and finished sessions, the metrics of each
+        open session and the totals of the finished ones.
+        """
+        return {
+            "open": len(self.sessions),
+            "finished": self.finished,
+            "sessions": [dict(session.metrics) for session in self.sessions],
+            "totals": dict(self.totals),
+        }
+
+
+async def random_client(
+    host: str, port: int, seed: int, duration: float, path: str | None = None
+) -> int:
+    """
+    Connects to a server as a stand-in player that sends a random input
+    every CLIENT_INPUT_INTERVAL seconds for duration seconds, resetting
+    after each game over, and returns how many bytes it received.
+    """
+    if path:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(seed)
+    received = 0
+
+    async def read():
+        nonlocal received
+        while line := await reader.readline():
+            received += len(line)
+            if line.startswith(b"over"):
+                writer.write(b"reset\n")
+
+    reading = asyncio.create_task(read())
+    loop = asyncio.get_running_loop()
+    end = loop.time() + duration
+    while loop.time() < end:
+        writer.write(rng.choice(("left", "right", "rotate", "down", "drop")).encode())
+        writer.write(b"\n")
+        await writer.drain()
+        await asyncio.sleep(CLIENT_INPUT_INTERVAL)
+    writer.write(b"quit\n")
+    await writer.drain()
+    await reading
+    writer.close()
+    return received
+
+
+async def serve(args) -> None:
+    server = Server(args.width, args.height, args.seed)
+    listener = await server.start(args.host, args.port, args.unix)
+    async with listener:
+        if not args.clients:
+            print(f"listening on {args.unix or listener.sockets[0].getsockname()}")
+            await listener.serve_forever()
+        port = listener.sockets[0].getsockname()[1] if not args.unix else None
+        received = await asyncio.gather(
+            *(
+                random_client(args.host, port, seed, args.duration, args.unix)
+                for seed in range(args.clients)
+            )
+        )
+        # Let the sessions see the clients leave
+        while server.sessions:
+            await asyncio.sleep(0.01)
+        print(f"clients: {args.clients}, bytes received: {sum(received)}")
+        for name, value in server.metrics()["totals"].items():
+            print(f"{name}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host games over a socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket")
+    parser.add_argument("--seed", type=parse_seed, help="the seed of the first game")
+    parser.add_argument("--width", type=int, default=X_TILES)
+    parser.add_argument("--height", type=int, default=Y_TILES)
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=0,
+        help="connect this many random local clients and report the metrics",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="how long the clients play"
+    )
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
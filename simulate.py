@@ -0,0 +1,183 @@
+import argparse
+import math
+import multiprocessing
+import random
+from typing import Callable, NamedTuple
+
+from bot import Bot
+from engine import ACTIONS, X_TILES, Y_TILES, Engine
+from replay import parse_seed
+
+MAX_TICKS = 100_000  # The number of ticks after which a game is stopped
+# The number of ticks after which a game of the bot, which rarely loses, is
+# stopped on the command line, about 15 seconds of searching on one core
+BOT_MAX_TICKS = 5_000
+
+
+class GameResult(NamedTuple):
+    seed: int
+    score: int
+    lines: int
+    pieces: int
+    ticks: int  # How many ticks the game survived for
+
+
+class RandomPolicy:
+    """
+    Presses a random key, or none at all, on every tick.
+    """
+
+    def __init__(self, seed: int | None = None):
+        self.random = random.Random(seed)
+        self.choices = ACTIONS + (None,)
+
+    def __call__(self, engine: Engine) -> str | None:
+        return self.random.choice(self.choices)
+
+
+class ScriptedPolicy:
+    """
+    Plays a fixed sequence of actions, one per tick, starting over once it
+    reaches the end. None in the sequence means that no key is pressed.
+    """
+
+    def __init__(self, actions: list[str | None]):
+        self.actions = list(actions)
+        self.index = 0
+
+    def __call__(self, engine: Engine) -> str | None:
+        action = self.actions[self.index % len(self.actions)]
+        self.index += 1
+        return action
+
+
+def make_policy(policy, seed: int) -> Callable[[Engine], str | None]:
+    """
+    Builds the policy for one game. policy is "random", "bot", a list of
+    actions for a ScriptedPolicy, or a callable that is given the engine on
+    every tick and returns an action from ACTIONS, a list of them or None.
+    Callables are used as they are and need to be picklable, e.g. a module
+    level function, to reach the workers. The bot searches without a time
+    budget, so that its games only depend on their seed.
+    """
+    if policy == "random":
+        return RandomPolicy(seed)
+    if policy == "bot":
+        return Bot(time_budget=math.inf)
+    if isinstance(policy, (list, tuple)):
+        return ScriptedPolicy(policy)
+    if callable(policy):
+        return policy
+    raise ValueError(f"Unknown policy: {policy!r}")
+
+
+def play_game(
+    seed: int,
+    policy="random",
+    max_ticks: int = MAX_TICKS,
+    width: int = X_TILES,
+    height: int = Y_TILES,
+) -> GameResult:
+    """
+    Plays a single game as fast as possible, asking the policy for an action,
+    or a list of actions to apply at once, before every tick in which a shape
+    is moving.
+    """
+    engine = Engine(width, height, seed=seed, instant_cascades=True)
+    policy = make_policy(policy, seed)
+    while not engine.is_game_over() and engine.ticks < max_ticks:
+        if engine.state_machine.state == "shape_moving":
+            action = policy(engine)
+            if isinstance(action, list):
+                for a in action:
+                    engine.apply(a)
+            elif action is not None:
+                engine.apply(action)
+        engine.tick()
+    return GameResult(seed, engine.score, engine.lines, engine.pieces, engine.ticks)
+
+
+def play_game_star(args: tuple) -> GameResult:
+    return play_game(*args)
+
+
+def run_batch(
+    num_games: int,
+    first_seed: int = 0,
+    policy="random",
+    processes: int | None = None,
+    max_ticks: int = MAX_TICKS,
+    width: int = X_TILES,
+    height: int = Y_TILES,
+) -> list[GameResult]:
+    """
+    Plays num_games games seeded with first_seed, first_seed + 1, ... across a
+    pool of worker processes, one per core unless processes is given, and
+    returns their results in seed order.
+    """
+    jobs = [
+        (seed, policy, max_ticks, width, height)
+        for seed in range(first_seed, first_seed + num_games)
+    ]
+    if processes == 1:
+        return [play_game_star(job) for job in jobs]
+    with multiprocessing.Pool(processes) as pool:
+        # Small chunks keep every worker busy when game lengths vary a lot
+        chunksize = max(
+            1, len(jobs) // (4 * (processes or multiprocessing.cpu_count()))
+        )
+        results = list(pool.imap_unordered(play_game_star, jobs, chunksize))
+    return sorted(results, key=lambda result: result.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless games.")
+    parser.add_argument("games", type=int, help="the number of games to play")
+    parser.add_argument("--seed", type=parse_seed, default=0, help="the first seed")
+    parser.add_argument(
+        "--script",
+        nargs="+",
+        choices=ACTIONS + ("none",),
+        help="play this sequence of actions instead of random ones",
+    )
+    parser.add_argument("--bot", action="store_true", help="let bot.Bot play")
+    parser.add_argument("--processes", type=int, help="the number of workers")
+    parser.add_argument(
+        "--max-ticks",
+        type=int,
+        help=f"stop games after this many ticks, {MAX_TICKS} or {BOT_MAX_TICKS} "
+        "with --bot by default",
+    )
+    parser.add_argument("--width", type=int, default=X_TILES)
+    parser.add_argument("--height", type=int, default=Y_TILES)
+    args = parser.parse_args()
+
+    policy = "random"
+    max_ticks = args.max_ticks
+    if max_ticks is None:
+        max_ticks = BOT_MAX_TICKS if args.bot else MAX_TICKS
+    if args.bot:
+        policy = "bot"
+    elif args.script:
+        policy = [None if action == "none" else action for action in args.script]
+    results = run_batch(
+        args.games,
+        args.seed,
+        policy,
+        args.processes,
+        max_ticks,
+        args.width,
+        args.height,
+    )
+    for result in results:
+        print(
+            f"seed {result.seed}: score {result.score}, lines {result.lines}, "
+            f"pieces {result.pieces}, ticks {result.ticks}"
+        )
+    for field in ("score", "lines", "pieces", "ticks"):
+        mean = sum(getattr(result, field) for result in results) / len(results)
+        print(f"mean {field}: {mean:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import bisect
+import json
+import time
+from collections import deque
+
+from engine import Engine
+
+TELEMETRY_WINDOW = 600  # The number of recent timings kept for each operation
+# Upper bounds of the histogram buckets in milliseconds, plus one for the rest
+HISTOGRAM_BOUNDS = (0.01, 0.03, 0.1, 0.3, 1, 3, 10, 30)
+# The canvas methods whose calls are counted
+CANVAS_OPERATIONS = (
+    "create_rectangle",
+    "create_line",
+    "create_text",
+    "coords",
+    "move",
+    "itemconfigure",
+    "delete",
+)
+
+
+class Timing:
+    """
+    The number of calls of one operation, their total and longest time, and
+    the times of the most recent calls, in seconds.
+    """
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.peak = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.peak:
+            self.peak = seconds
+        self.recent.append(seconds)
+
+    def histogram(self) -> list[int]:
+        """
+        Returns how many of the recent calls fell in each bucket of
+        HISTOGRAM_BOUNDS, with a last bucket for anything longer.
+        """
+        counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        for seconds in self.recent:
+            counts[bisect.bisect_left(HISTOGRAM_BOUNDS, 1000 * seconds)] += 1
+        return counts
+
+
+class CountingCanvas:
+    """
+    Stands in for a canvas and counts the calls of CANVAS_OPERATIONS before
+    passing them on.
+    """
+
+    def __init__(self, canvas, telemetry: "Telemetry"):
+        self.canvas = canvas
+        self.telemetry = telemetry
+
+    def __getattr__(self, name: str):
+        method = getattr(self.canvas, name)
+        if name not in CANVAS_OPERATIONS:
+            return method
+        counters = self.telemetry.counters
+        key = f"canvas.{name}"
+
+        def counted(*args, **kwargs):
+            counters[key] = counters.get(key, 0) + 1
+            return method(*args, **kwargs)
+
+        return counted
+
+
+class Telemetry:
+    """
+    Opt-in timing of where the game spends its time. Nothing is measured
+    until objects are attached: attach_engine times every tick by the state
+    it ran in, as "state.<state>", and every action by name, as
+    "input.<action>". instrument times any other method, such as the steps
+    of a renderer, and count_canvas counts the drawing calls made on a
+    canvas. Objects that are not attached run their own code untouched, so a
+    game without telemetry pays nothing for it.
+
+    Times are kept per operation as totals and as a rolling window of the
+    most recent calls, from which histograms are built.
+    """
+
+    def __init__(self, window: int = TELEMETRY_WINDOW, clock=time.perf_counter):
+        self.window = window
+        self.clock = clock
+        self.timings = {}
+        self.counters = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        """
+        Adds the time one call of an operation took.
+        """
+        timing = self.timings.get(key)
+        if timing is None:
+            timing = self.timings[key] = Timing(self.window)
+        timing.add(seconds)
+
+    def instrument(self, obj, name: str, key: str | None = None) -> None:
+        """
+        Replaces a method on obj with one that records how long each call
+        takes under key, or the name of the method.
+        """
+        method = getattr(obj, name)
+        key = key or name
+        clock = self.clock
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(key, clock() - start)
+
+        setattr(obj, name, timed)
+
+    def attach_engine(self, engine: Engine) -> None:
+        """
+        Times the ticks of an engine by state and its actions by name.
+        """
+        tick = engine.tick
+        apply = engine.apply
+        state_machine = engine.state_machine
+        clock = self.clock
+
+        def timed_tick():
+            state = state_machine.state
+            start = clock()
+            try:
+                tick()
+            finally:
+                self.record(f"state.{state}", clock() - start)
+
+        def timed_apply(action):
+            start = clock()
+            try:
+                apply(action)
+            finally:
+                self.record(f"input.{action}", clock() - start)
+
+        engine.tick = timed_tick
+        engine.apply = timed_apply
+
+    def count_canvas(self, canvas) -> CountingCanvas:
+        """
+        Returns a canvas to draw on in place of canvas that counts its calls.
+        """
+        return CountingCanvas(canvas, self)
+
+    def summary(self, limit: int | None = None) -> list[str]:
+        """
+        Returns one line per operation with its mean and longest recent time
+        in milliseconds, for the limit operations that took the most time
+        recently, or all of them, followed by the counters.
+        """
+        lines = []
+        for key, timing in sorted(
+            self.timings.items(), key=lambda item: -sum(item[1].recent)
+        )[:limit]:
+            recent = timing.recent
+            mean = 1000 * sum(recent) / len(recent)
+            lines.append(f"{key}: {mean:.3f} ms avg, {1000 * max(recent):.3f} max")
+        for key, count in sorted(self.counters.items()):
+            lines.append(f"{key}: {count}")
+        return lines
+
+    def as_dict(self) -> dict:
+        """
+        Returns everything measured so far, with times in milliseconds.
+        """
+        labels = [f"<{bound}ms" for bound in HISTOGRAM_BOUNDS]
+        labels.append(f">={HISTOGRAM_BOUNDS[-1]}ms")
+        return {
+            "timings": {
+                key: {
+                    "count": timing.count,
+                    "total_ms": 1000 * timing.total,
+                    "mean_ms": 1000 * timing.total / timing.count,
+                    "max_ms": 1000 * timing.peak,
+                    "recent_histogram": dict(zip(labels, timing.histogram())),
+                }
+                for key, timing in self.timings.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def dump(self, path: str, **extra) -> None:
+        """
+        Writes as_dict, and any extra entries, to a JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump({**self.as_dict(), **extra}, f, indent=2)
@@ -1,9 +1,18 @@
+import argparse
+import os
 import random
-import tkinter
+import time
+
+from bot import Bot
+from controls import Controls
+from engine import QUEUE_LENGTH, SHAPES, X_TILES, Y_TILES, Engine
+from events import EventBus, FileSink
+from renderers import NullRenderer, Renderer, TerminalRenderer
+from replay import Recorder, parse_seed
+from scheduler import FixedTimestep
+from telemetry import Telemetry
 
 # GLOBAL CONSTANTS
-X_TILES = 10  # The number of tiles in the x direction of the Tetris board
-Y_TILES = 20  # The number of tiles in the y direction of the Tetris board
 TILE_WIDTH = 33  # The width of each tile in pixels
 GHOST_BLOCK_WIDTH = TILE_WIDTH - 2  # The width of a ghost tile in pixels
 LEFT_BORDER_WIDTH = 1  # Border width on the left side of the board
@@ -21,83 +30,192 @@ BORDER_COLOR = "gray"  # The color of the borders around the Tetris board
 GRID_COLOR = "gray"  # The color of the grid on the Tetris board.
 SCORE_COLOR = "gray"  # The color of the score
 GAME_OVER_COLOR = "white"  # The color of the game over message
-CENTER = X_TILES / 2 - 1  # The center of the game board
 WIDTH = (
     X_TILES + RIGHT_BORDER_WIDTH + LEFT_BORDER_WIDTH
 ) * TILE_WIDTH  # The width of the window in pixels
 HEIGHT = (
     Y_TILES + TOP_BORDER_WIDTH + BOTTOM_BORDER_WIDTH
 ) * TILE_WIDTH  # The height of the window in pixels
-FRAMES_PER_SECOND = 3  # The number of frames and board updates per second
-QUEUE_LENGTH = 3  # The length of the queue
+FRAMES_PER_SECOND = 60  # The number of frames drawn per second
+MAX_TICKS_PER_FRAME = 5  # The most ticks run to catch up after a late frame
 GAP_BETWEEN_QUEUE_PIECES = 1  # The gap between shapes in the queue
 GHOST_BLOCK_BORDER_WIDTH = 2  # The width of the border of ghost blocks
+TELEMETRY_OVERLAY_FRAMES = 30  # The number of frames between telemetry overlay updates
+TELEMETRY_OVERLAY_LINES = 6  # The number of operations shown in the overlay
+# The action of each key that moves the shape, by keysym
+KEY_ACTIONS = {
+    "Left": "left",
+    "a": "left",
+    "Right": "right",
+    "d": "right",
+    "Up": "rotate",
+    "w": "rotate",
+    "Down": "down",
+    "s": "down",
+    "space": "drop",
+}
+# The renderers that can be chosen with --renderer besides the Tk window
+HEADLESS_RENDERERS = {"terminal": TerminalRenderer, "null": NullRenderer}
+# The color of each shape
+COLORS = ["red", "green", "blue", "yellow", "orange", "purple", "cyan"]
+
+
+class CanvasRenderer(Renderer):
+    """
+    Draws an engine onto a Tk canvas using a fixed pool of rectangles that are
+    created once: one for every tile of the board, four for the ghost blocks
+    and four for each shape in the queue. Each render compares the engine with
+    what was drawn last time and only reconfigures the rectangles that changed.
+    """
+
+    def __init__(self, canvas, engine: Engine):
+        super().__init__(engine)
+        self.canvas = canvas
+        # Ghost rectangles are created first so that blocks are drawn over them
+        self.ghost_items = [self.create_ghost_item() for _ in range(4)]
+        self.tile_items = [
+            [self.create_tile_item(x, y) for x in range(X_TILES)]
+            for y in range(Y_TILES)
+        ]
+        self.queue_items = [
+            self.create_tile_item(0, 0) for _ in range(4 * QUEUE_LENGTH)
+        ]
+        # What is currently drawn, used to find the rectangles that changed
+        self.drawn_tiles = [[None] * X_TILES for _ in range(Y_TILES)]
+        self.drawn_ghost = [None] * len(self.ghost_items)
+        self.drawn_queue = None
+
+    def create_tile_item(self, x: int, y: int) -> int:
+        return self.canvas.create_rectangle(
+            (x + LEFT_BORDER_WIDTH) * TILE_WIDTH,
+            (y + TOP_BORDER_WIDTH) * TILE_WIDTH,
+            (x + LEFT_BORDER_WIDTH + 1) * TILE_WIDTH,
+            (y + TOP_BORDER_WIDTH + 1) * TILE_WIDTH,
+            fill=BG_COLOR,
+            outline=GRID_COLOR,
+            state="hidden",
+        )
+
+    def create_ghost_item(self) -> int:
+        return self.canvas.create_rectangle(
+            0,
+            0,
+            0,
+            0,
+            fill=BG_COLOR,
+            outline=BG_COLOR,
+            width=GHOST_BLOCK_BORDER_WIDTH,
+            state="hidden",
+        )
 
+    def render(self) -> None:
+        """
+        Brings the canvas up to date with the engine.
+        """
+        self.render_tiles()
+        self.render_ghost()
+        self.render_queue()
 
-class Block:
-    def __init__(self, canvas, x, y, color, ghost_block=False):
-        self.canvas = canvas
-        self.x = x
-        self.y = y
-        self.color = color
-        if ghost_block is False:
-            self.shape = self.canvas.create_rectangle(
-                (x + LEFT_BORDER_WIDTH) * TILE_WIDTH,
-                (y + TOP_BORDER_WIDTH) * TILE_WIDTH,
-                (x + LEFT_BORDER_WIDTH + 1) * TILE_WIDTH,
-                (y + TOP_BORDER_WIDTH + 1) * TILE_WIDTH,
-                fill=color,
-                outline=GRID_COLOR,
-            )
-        else:
-            self.shape = self.canvas.create_rectangle(
+    def render_tiles(self) -> None:
+        """
+        Shows the inactive and active blocks in the pooled board rectangles.
+        """
+        cells = self.engine.board.cells
+        colors = [
+            [
+                COLORS[code - 1] if code else None
+                for code in cells[y * X_TILES : (y + 1) * X_TILES]
+            ]
+            for y in range(Y_TILES)
+        ]
+        for x, y, shape in self.engine.active_blocks:
+            if 0 <= x < X_TILES and 0 <= y < Y_TILES:
+                colors[y][x] = COLORS[shape]
+        for y in range(Y_TILES):
+            drawn_row = self.drawn_tiles[y]
+            row = colors[y]
+            if row == drawn_row:
+                continue
+            for x in range(X_TILES):
+                color = row[x]
+                if color != drawn_row[x]:
+                    if color is None:
+                        self.canvas.itemconfigure(self.tile_items[y][x], state="hidden")
+                    else:
+                        self.canvas.itemconfigure(
+                            self.tile_items[y][x], fill=color, state="normal"
+                        )
+                    drawn_row[x] = color
+
+    def render_ghost(self) -> None:
+        """
+        Moves the pooled ghost rectangles to where the active shape would land.
+        """
+        ghost = [None] * len(self.ghost_items)
+        if self.engine.state_machine.state == "shape_moving":
+            for i, ((x, y), (_, _, shape)) in enumerate(
+                zip(self.engine.ghost_blocks(), self.engine.active_blocks)
+            ):
+                ghost[i] = (x, y, COLORS[shape])
+        for item, drawn, new in zip(self.ghost_items, self.drawn_ghost, ghost):
+            if new == drawn:
+                continue
+            if new is None:
+                self.canvas.itemconfigure(item, state="hidden")
+                continue
+            x, y, color = new
+            self.canvas.coords(
+                item,
                 (x + LEFT_BORDER_WIDTH) * TILE_WIDTH + GHOST_BLOCK_BORDER_WIDTH,
                 (y + TOP_BORDER_WIDTH) * TILE_WIDTH + GHOST_BLOCK_BORDER_WIDTH,
                 (x + LEFT_BORDER_WIDTH + 1) * TILE_WIDTH - 1,
                 (y + TOP_BORDER_WIDTH + 1) * TILE_WIDTH - 1,
-                fill=BG_COLOR,
-                outline=color,
-                width=GHOST_BLOCK_BORDER_WIDTH,
             )
+            if drawn is None or drawn[2] != color:
+                self.canvas.itemconfigure(item, outline=color, state="normal")
+        self.drawn_ghost = ghost
 
-    def move(self, dx: int, dy: int) -> None:
-        self.x += dx
-        self.y += dy
-        self.canvas.move(self.shape, dx * TILE_WIDTH, dy * TILE_WIDTH)
-
-    def move_down(self) -> None:
-        self.move(0, 1)
-
-    def move_left(self) -> None:
-        self.move(-1, 0)
-
-    def move_right(self) -> None:
-        self.move(1, 0)
-
-    def delete(self) -> None:
-        self.canvas.delete(self.shape)
-
-
-class StateMachine:
-    def __init__(self):
-        self.states = [
-            "shape_moving",
-            "clearing_rows",
-            "spawn_shape",
-            "paused",
-            "game_over",
-        ]
-        self.state = "spawn_shape"
-        self.previous_state = None
-
-    def set_state(self, state: str) -> None:
-        if state in self.states:
-            self.previous_state = self.state
-            self.state = state
+    def render_queue(self) -> None:
+        """
+        Moves and recolors the pooled queue rectangles when the queue changes.
+        """
+        queue = tuple(self.engine.shape_queue)
+        if queue == self.drawn_queue:
+            return
+        self.drawn_queue = queue
+        items = iter(self.queue_items)
+        queue_x = X_TILES + MIDDLE_GAP + QUEUE_WIDTH // 2 - 1
+        current_y = SCORE_HEIGHT + RIGHT_GAP + GAP_BETWEEN_QUEUE_PIECES + 1
+        for s in queue:
+            shape = SHAPES[s]
+            for x, y in shape:
+                x += queue_x + LEFT_BORDER_WIDTH
+                y += current_y + TOP_BORDER_WIDTH
+                item = next(items)
+                self.canvas.coords(
+                    item,
+                    x * TILE_WIDTH,
+                    y * TILE_WIDTH,
+                    (x + 1) * TILE_WIDTH,
+                    (y + 1) * TILE_WIDTH,
+                )
+                self.canvas.itemconfigure(item, fill=COLORS[s], state="normal")
+            current_y += GAP_BETWEEN_QUEUE_PIECES + max([y for _, y in shape]) + 1
 
 
 class Game:
-    def __init__(self, main):
+    def __init__(
+        self,
+        main,
+        seed: int | None = None,
+        record_dir: str | None = None,
+        telemetry: Telemetry | None = None,
+        event_sink=None,
+    ):
+        # Tk is only imported once a window is made, so that the rest of the
+        # game can be used without it
+        import tkinter
+
         self.main = main
         self.canvas = tkinter.Canvas(main, width=WIDTH, height=HEIGHT, bg=BORDER_COLOR)
         # Create Tetris board
@@ -143,65 +261,36 @@ class Game:
             fill=BG_COLOR,
         )
 
-        self.state_machine = StateMachine()
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.engine = Engine(seed=seed)
+        # Games are only recorded when a directory to save them in is given
+        self.record_dir = record_dir
+        self.recorder = Recorder(self.engine) if record_dir else None
+        self.events = EventBus(self.engine, [event_sink]) if event_sink else None
+        self.engine.add_listener(self.on_engine_event)
+
+        self.scheduler = FixedTimestep(
+            self.engine.get_tick_interval(), MAX_TICKS_PER_FRAME
+        )
+        # Keys only record what was pressed, the game loop applies the actions
+        self.controls = Controls(X_TILES, Y_TILES, clock=self.scheduler.clock)
 
         # Connect keyboard input
         self.canvas.focus_set()
-        self.canvas.bind("<Right>", lambda event: self.move_shape_right())
-        self.canvas.bind("<Up>", lambda event: self.rotate())
-        self.canvas.bind("<Left>", lambda event: self.move_shape_left())
-        self.canvas.bind("<Down>", lambda event: self.key_move_shape_down())
-        self.canvas.bind("<space>", lambda event: self.key_move_shape_fully_down())
-        self.canvas.bind("<d>", lambda event: self.move_shape_right())
-        self.canvas.bind("<w>", lambda event: self.rotate())
-        self.canvas.bind("<a>", lambda event: self.move_shape_left())
-        self.canvas.bind("<s>", lambda event: self.key_move_shape_down())
-        self.canvas.bind("<p>", lambda event: self.toggle_pause())
+        self.canvas.bind("<KeyPress>", self.on_key_press)
+        self.canvas.bind("<KeyRelease>", self.on_key_release)
+        self.canvas.bind("<FocusOut>", lambda event: self.controls.release_all())
+        self.canvas.bind("<p>", lambda event: self.engine.toggle_pause())
         self.canvas.bind("<r>", lambda event: self.reset())
 
-        # Shapes and their corresponding colors and rotation points
-        shape0 = [[1, 0], [0, 1], [1, 1], [2, 1]]
-        shape1 = [[2, 0], [0, 1], [1, 1], [2, 1]]
-        shape2 = [[0, 0], [0, 1], [1, 1], [2, 1]]
-        shape3 = [[0, 0], [0, 1], [0, 2], [0, 3]]
-        shape4 = [[0, 0], [0, 1], [1, 1], [1, 2]]
-        shape5 = [[0, 0], [0, 1], [1, 0], [1, 1]]
-        shape6 = [[1, 0], [1, 1], [0, 1], [0, 2]]
-        self.shapes = [shape0, shape1, shape2, shape3, shape4, shape5, shape6]
-        rotation_point0 = [CENTER + 1, 1]
-        rotation_point1 = [CENTER + 1, 1]
-        rotation_point2 = [CENTER + 1, 1]
-        rotation_point3 = [CENTER - 0.5, 1.5]
-        rotation_point4 = [CENTER + 0, 1]
-        rotation_point5 = [CENTER + 0.5, 0.5]
-        rotation_point6 = [CENTER + 1, 1]
-        self.rotation_points = [
-            rotation_point0,
-            rotation_point1,
-            rotation_point2,
-            rotation_point3,
-            rotation_point4,
-            rotation_point5,
-            rotation_point6,
-        ]
-        self.colors = ["red", "green", "blue", "yellow", "orange", "purple", "cyan"]
-
-        self.shape_queue = [
-            random.randint(0, len(self.shapes) - 1) for _ in range(QUEUE_LENGTH)
-        ]
-
-        self.shape_queue_blocks = []
-
-        # A list containing the blocks in the active moving shape
-        self.active_blocks = []
-        self.rotation_point = None
-
-        # The ghost blocks showing where the current active blocks will fall
-        self.ghost_blocks = []
-
-        self.inactive_blocks = []
-
-        self.score = 0
+        self.renderer = CanvasRenderer(self.canvas, self.engine)
+        # Telemetry is only attached when asked for, so that it costs nothing otherwise
+        self.telemetry = telemetry
+        self.telemetry_message = None
+        if telemetry:
+            self.attach_telemetry()
+        self.render_pending = False
 
         self.score_message = None
         self.game_over_message = None
@@ -212,321 +301,100 @@ class Game:
         self.canvas.pack()
         self.game_loop()
 
-    def can_move_left(self) -> bool:
-        """
-        Checks if the moving shape collides with the left wall or an inactive block.
-        """
-        for b in self.active_blocks:
-            if b.x == 0:
-                return False
-            for i in self.inactive_blocks:
-                if b.y == i.y and b.x - 1 == i.x:
-                    return False
-        return True
+    def attach_telemetry(self) -> None:
+        """
+        Times the engine and each step of rendering, counts the canvas calls
+        the renderer makes and shows the costliest operations in an overlay.
+        """
+        self.telemetry.attach_engine(self.engine)
+        self.renderer.canvas = self.telemetry.count_canvas(self.canvas)
+        self.telemetry.instrument(self.renderer, "render")
+        for name in ("render_tiles", "render_ghost", "render_queue"):
+            self.telemetry.instrument(self.renderer, name, f"render.{name[7:]}")
+        self.telemetry_message = self.canvas.create_text(
+            (LEFT_BORDER_WIDTH + X_TILES + MIDDLE_GAP) * TILE_WIDTH + 4,
+            (TOP_BORDER_WIDTH + SCORE_HEIGHT + RIGHT_GAP + QUEUE_HEIGHT) * TILE_WIDTH
+            - 4,
+            anchor="sw",
+            font=("Courier", "8"),
+            fill=SCORE_COLOR,
+        )
 
-    def can_move_right(self) -> bool:
+    def update_telemetry_overlay(self) -> None:
         """
-        Check if the shape collides with the right wall or an inactive block.
+        Shows the frame rate and the costliest recent operations in the overlay.
         """
-        for b in self.active_blocks:
-            if b.x == X_TILES - 1:
-                return False
-            for i in self.inactive_blocks:
-                if b.y == i.y and b.x + 1 == i.x:
-                    return False
-        return True
+        stats = self.scheduler.stats()
+        lines = [
+            f"fps: {stats['fps']:.1f}, work: {stats['work_time_mean_ms']:.2f} ms avg"
+        ]
+        lines += self.telemetry.summary(TELEMETRY_OVERLAY_LINES)
+        self.canvas.itemconfigure(self.telemetry_message, text="\n".join(lines))
+
+    def on_key_press(self, event) -> None:
+        if event.keysym in KEY_ACTIONS:
+            self.controls.press(KEY_ACTIONS[event.keysym], event.time)
 
-    def can_move_down(self, blocks: list[Block]) -> bool:
+    def on_key_release(self, event) -> None:
+        if event.keysym in KEY_ACTIONS:
+            self.controls.release(KEY_ACTIONS[event.keysym], event.time)
+
+    def on_engine_event(self, event: str, *args) -> None:
         """
-        Checks if the shape can move down by checking if it is in the bottom
-        row or directly above an inactive block.
+        Shows and hides messages for engine events and schedules a render so
+        that several changes made in a row are drawn together.
         """
-        for b in blocks:
-            if b.y == Y_TILES - 1:
-                return False
-            for i in self.inactive_blocks:
-                if b.y + 1 == i.y and b.x == i.x:
-                    return False
-        return True
-
-    def move_shape_down(self) -> None:
-        """
-        Moves the shape down by one tile if possible.
-        """
-        if self.can_move_down(self.active_blocks):
-            for b in self.active_blocks:
-                b.move_down()
-            if self.rotation_point:
-                self.rotation_point[1] += 1
-        else:
-            self.deactivate_blocks()
-
-    def key_move_shape_down(self) -> None:
-        """
-        Moves the shape down by one tile forcefully by keyboard input if possible.
-        """
-        if self.state_machine.state == "shape_moving":
-            self.move_shape_down()
-            self.score += 10
-
-    def key_move_shape_fully_down(self) -> None:
-        """
-        Moves the shape as far down as it can currently go focefully by
-        keyboard input.
-        """
-        if self.state_machine.state == "shape_moving":
-            distance = 0
-            while self.can_move_down(self.active_blocks):
-                self.move_shape_down()
-                distance += 1
-            self.score += distance * distance * 10
-            self.deactivate_blocks()
-
-    def move_shape_right(self) -> None:
-        """
-        Moves the shape right by one tile if possible.
-        """
-        if self.state_machine.state == "shape_moving" and self.can_move_right():
-            for b in self.active_blocks:
-                b.move_right()
-            self.rotation_point[0] += 1
-            self.update_ghost_blocks()
-
-    def move_shape_left(self) -> None:
-        """
-        Moves the shape left by one tile if possible.
-        """
-        if self.state_machine.state == "shape_moving" and self.can_move_left():
-            for b in self.active_blocks:
-                b.move_left()
-            self.rotation_point[0] -= 1
-            self.update_ghost_blocks()
-
-    def update_ghost_blocks(self) -> None:
-        """
-        Draws the ghost blocks at the current shape's current stopping point.
-        """
-        for b in self.ghost_blocks:
-            b.delete()
-        self.ghost_blocks = []
-        if self.state_machine.state == "shape_moving":
-            for b in self.active_blocks:
-                ghost_block = Block(self.canvas, b.x, b.y, b.color, ghost_block=True)
-                self.ghost_blocks.append(ghost_block)
-            while self.can_move_down(self.ghost_blocks):
-                for b in self.ghost_blocks:
-                    b.move_down()
-            # Raise active blocks to the top of the canvas stack so that they appear on top of the ghost blocks
-            for b in self.active_blocks:
-                self.canvas.tag_raise(b.shape)
-
-    def undo_rotate(self) -> None:
-        """
-        Undoes a rotation
-        """
-        for b in self.active_blocks:
-            dx = self.rotation_point[0] - b.x
-            dy = self.rotation_point[1] - b.y
-            b.move(dx - dy, dy + dx)
-
-    def rotate(self) -> None:
-        """
-        Rotates the active shape by 90 degrees purely mathematically.
-        If the rotation causes a collision with inactivate blocks or
-        a side wall, it will attempt to move the shape left or right
-        by one tile if possible otherwise the rotation will not occur.
-        """
-        if self.state_machine.state == "shape_moving":
-            # Rotate blocks into new position
-            for b in self.active_blocks:
-                dx = self.rotation_point[0] - b.x
-                dy = self.rotation_point[1] - b.y
-                b.move(dx + dy, dy - dx)
-            # If any of the blocks are colliding with walls in their new position, see if they can be shifted 1 left or right
-            for b in self.active_blocks:
-                # Check floor for collision, if there is collision undo the rotation since it is invalid:
-                if b.y == Y_TILES:
-                    self.undo_rotate()
-                    return
-                # Check left and right walls for collision
-                if b.x == -1 and self.can_move_right():
-                    self.move_shape_right()
-                elif b.x == X_TILES and self.can_move_left():
-                    self.move_shape_left()
-                # Check inactive blocks for collision
-                for i in self.inactive_blocks:
-                    if b.x == i.x and b.y == i.y:
-                        if self.can_move_left():
-                            self.move_shape_left()
-                        elif self.can_move_right():
-                            self.move_shape_right()
-                        # If the shape can't be rotated by shifting it left or right by 1, then it is invalid so undo it
-                        else:
-                            self.undo_rotate()
-                            return
-            self.update_ghost_blocks()
-
-    def spawn_shape(self) -> None:
-        rng = self.shape_queue.pop(0)
-        shape = self.shapes[rng]
-        color = self.colors[rng]
-        self.rotation_point = list(self.rotation_points[rng])
-        for x, y in shape:
-            self.active_blocks.append(Block(self.canvas, x + CENTER, y, color))
-        self.shape_queue.append(random.randint(0, len(self.shapes) - 1))
-        self.draw_shape_queue()
-
-    def draw_shape_queue(self) -> None:
-        for b in self.shape_queue_blocks:
-            b.delete()
-        self.shape_queue_blocks = []
-        queue_x = X_TILES + MIDDLE_GAP + QUEUE_WIDTH // 2 - 1
-        current_y = SCORE_HEIGHT + RIGHT_GAP + GAP_BETWEEN_QUEUE_PIECES + 1
-        for s in self.shape_queue:
-            shape = self.shapes[s]
-            color = self.colors[s]
-            for x, y in shape:
-                self.shape_queue_blocks.append(
-                    Block(self.canvas, queue_x + x, current_y + y, color)
-                )
-            current_y += GAP_BETWEEN_QUEUE_PIECES + max([y for _, y in shape]) + 1
-
-    def deactivate_blocks(self) -> None:
-        """
-        Turns the current active blocks into inactive blocks if they are in collision.
-        First we find all blocks that are in collision with the floor or an inactive block,
-        keep track of their indices, and add the coordinates above, left, and right of those
-        blocks to a queue of coordinates to check. We then process that queue and search for any
-        other active blocks above, below, left, or right of any other active blocks we find in
-        collision. Finally, we deactivate the blocks that we found to be in collision.
-
-        The algorithm is a bit complex with the current implementation, but it is required in
-        order to handle cases where a falling shape is made up of two separate clusters of blocks
-        that are not in collision with eachother.
-        """
-        indices_in_collision = []
-        coordinates_to_check = []
-        for i in range(len(self.active_blocks)):
-            b = self.active_blocks[i]
-            x = b.x
-            y = b.y
-            if y + 1 == Y_TILES or [x, y + 1] in [
-                [b.x, b.y] for b in self.inactive_blocks
-            ]:
-                indices_in_collision.append(i)
-                coordinates_to_check.append([x + 1, y])
-                coordinates_to_check.append([x - 1, y])
-                coordinates_to_check.append([x, y - 1])
-        while len(coordinates_to_check) > 0:
-            x, y = coordinates_to_check.pop(0)
-            for i in range(len(self.active_blocks)):
-                if i not in indices_in_collision:
-                    b = self.active_blocks[i]
-                    if x == b.x and y == b.y:
-                        indices_in_collision.append(i)
-                        coordinates_to_check.append([x + 1, y])
-                        coordinates_to_check.append([x - 1, y])
-                        coordinates_to_check.append([x, y + 1])
-                        coordinates_to_check.append([x, y - 1])
-                        break
-        for i in range(len(self.active_blocks) - 1, -1, -1):
-            if i in indices_in_collision:
-                self.inactive_blocks.append(self.active_blocks[i])
-                del self.active_blocks[i]
-        self.state_machine.set_state("clearing_rows")
-        self.update_ghost_blocks()
-
-    def delete_blocks(self, blocks) -> None:
-        num_blocks = len(blocks)
-        for i in range(num_blocks):
-            this_block = blocks[num_blocks - 1 - i]
-            self.canvas.delete(this_block.shape)
-            del blocks[num_blocks - 1 - i]
-
-    def get_filled_rows(self) -> set[int]:
-        """
-        Returns a set of the row number of filled rows.
-        """
-        row_to_count = {}
-        filled_rows = set()
-        for b in self.inactive_blocks:
-            if b.y in row_to_count:
-                row_to_count[b.y] += 1
-                if row_to_count[b.y] == X_TILES:
-                    filled_rows.add(b.y)
+        if event == "pause":
+            if args[0]:
+                self.draw_pause_message()
             else:
-                row_to_count[b.y] = 1
-        return filled_rows
-
-    def delete_rows(self, rows_to_delete: set[int]) -> None:
-        """
-        Takes a set of rows and deletes the blocks in those rows.
-        Adds blocks above the lowest row deleted to the active blocks
-        and gives them the chance to cause more rows to be deleted after
-        they fall.
-        """
-        if len(rows_to_delete) > 0:
-            lowest_row_deleted = int(max(rows_to_delete))
-            num_inactive_blocks = len(self.inactive_blocks)
-            for i in range(num_inactive_blocks):
-                this_block = self.inactive_blocks[num_inactive_blocks - 1 - i]
-                if this_block.y in rows_to_delete:
-                    self.canvas.delete(this_block.shape)
-                    del self.inactive_blocks[num_inactive_blocks - 1 - i]
-                elif this_block.y < lowest_row_deleted:
-                    self.active_blocks.append(this_block)
-                    del self.inactive_blocks[num_inactive_blocks - 1 - i]
+                self.canvas.delete(self.pause_message)
+        elif event == "game_over":
+            self.draw_game_over_message()
+            if self.recorder:
+                self.save_replay()
+        elif event == "reset":
+            self.canvas.delete(self.game_over_message)
+        if not self.render_pending:
+            self.render_pending = True
+            self.main.after_idle(self.render)
 
-    def reset(self) -> None:
+    def render(self) -> None:
         """
-        Begins a new game after a game over.
+        Draws the changes made since the last render, if there are any.
         """
-        if self.state_machine.state == "game_over":
-            self.delete_blocks(self.active_blocks)
-            self.delete_blocks(self.inactive_blocks)
-            self.canvas.delete(self.game_over_message)
-            self.score = 0
-            self.state_machine.set_state("spawn_shape")
+        if self.render_pending:
+            self.render_pending = False
+            self.renderer.render()
 
-    def toggle_pause(self) -> None:
+    def reset(self) -> None:
         """
-        Handles pausing and unpausing.
+        Begins a new game with a new seed after a game over.
         """
-        if self.state_machine.state == "paused":
-            self.state_machine.state = self.state_machine.previous_state
-            self.canvas.delete(self.pause_message)
-        elif self.state_machine.state != "game_over":
-            self.state_machine.set_state("paused")
-            self.draw_pause_message()
+        if self.engine.is_game_over():
+            self.engine.reset(random.randrange(2**32))
 
-    def in_collision(self) -> bool:
+    def save_replay(self) -> None:
         """
-        Detects whether or not the current active blocks
-        are in collision with any inactive blocks.
+        Saves the game that just ended in the record directory.
         """
-        for active_block in self.active_blocks:
-            for inactive_block in self.inactive_blocks:
-                if (
-                    active_block.x == inactive_block.x
-                    and active_block.y == inactive_block.y
-                ):
-                    return True
-        return False
+        save_replay(self.recorder, self.record_dir)
 
     def get_score_text(self) -> str:
         """
-        Returns a string containing the score.
+        Returns a string containing the score and level.
         """
-        return "Score: " + str(self.score)
+        return f"Score: {self.engine.score}    Level: {self.engine.get_level()}"
 
     def draw_score_message(self) -> None:
         """
         Draws initial score text.
         """
+        self.score_text = self.get_score_text()
         self.score_message = self.canvas.create_text(
             (LEFT_BORDER_WIDTH + X_TILES + MIDDLE_GAP + SCORE_WIDTH / 2) * TILE_WIDTH,
             (TOP_BORDER_WIDTH + SCORE_HEIGHT / 2) * TILE_WIDTH,
-            text=self.get_score_text(),
+            text=self.score_text,
             fill=SCORE_COLOR,
         )
 
@@ -538,7 +406,7 @@ class Game:
             WIDTH / 2,
             HEIGHT / 2,
             text="Paused\nPress P to unpause",
-            justify=tkinter.CENTER,
+            justify="center",
             font=("Segoe UI", "40"),
             fill=GAME_OVER_COLOR,
         )
@@ -550,46 +418,147 @@ class Game:
         self.game_over_message = self.canvas.create_text(
             WIDTH / 2,
             HEIGHT / 2,
-            text=f"Game over! Final score: {self.score}\nPress R to reset",
-            justify=tkinter.CENTER,
+            text=f"Game over! Final score: {self.engine.score}\nPress R to reset",
+            justify="center",
             font=("Segoe UI", "40"),
             fill=GAME_OVER_COLOR,
         )
 
     def update_score_text(self) -> None:
         """
-        Updates the text in the score message.
+        Updates the text in the score message if the score changed.
         """
-        self.canvas.itemconfigure(self.score_message, text=self.get_score_text())
+        text = self.get_score_text()
+        if text != self.score_text:
+            self.score_text = text
+            self.canvas.itemconfigure(self.score_message, text=text)
 
     def game_loop(self):
-        if self.state_machine.state == "shape_moving":
-            self.move_shape_down()
-        elif self.state_machine.state == "clearing_rows":
-            if len(self.active_blocks) == 0:
-                rows_to_delete = self.get_filled_rows()
-                if len(rows_to_delete) > 0:
-                    self.delete_rows(rows_to_delete)
-                else:
-                    self.state_machine.set_state("spawn_shape")
-            else:
-                self.move_shape_down()
-        elif self.state_machine.state == "spawn_shape":
-            self.spawn_shape()
-            if self.in_collision():
-                self.state_machine.set_state("game_over")
-                self.draw_game_over_message()
-            else:
-                self.state_machine.set_state("shape_moving")
-                self.update_ghost_blocks()
+        """
+        Runs one frame: the actions of the keys pressed and held since the
+        last frame, the ticks the scheduler says are due, then a render. The
+        next frame is scheduled after what is left of the frame interval.
+        """
+        ticks = self.scheduler.advance()
+        for action in self.controls.poll():
+            self.engine.apply(action)
+        for _ in range(ticks):
+            self.engine.tick()
+        # Gravity speeds up as the level goes up
+        self.scheduler.tick_interval = self.engine.get_tick_interval()
+        self.render()
         self.update_score_text()
-        self.main.after(1000 // FRAMES_PER_SECOND, self.game_loop)
+        if self.telemetry and self.scheduler.frames % TELEMETRY_OVERLAY_FRAMES == 0:
+            self.update_telemetry_overlay()
+        work_time = self.scheduler.end_frame()
+        delay = max(1, round(1000 / FRAMES_PER_SECOND - 1000 * work_time))
+        self.main.after(delay, self.game_loop)
+
+
+def save_replay(recorder: Recorder, record_dir: str) -> None:
+    """
+    Saves the game a recorder recorded in the record directory.
+    """
+    os.makedirs(record_dir, exist_ok=True)
+    path = os.path.join(record_dir, f"tetris-{recorder.seed}.replay")
+    recorder.get_replay().save(path)
+
+
+def watch_bot(
+    renderer_class,
+    seed: int | None = None,
+    record_dir: str | None = None,
+    telemetry_path: str | None = None,
+    event_sink=None,
+) -> None:
+    """
+    Lets bot.Bot play one game at the speed of the Tk game, drawn by one of
+    the renderers that do not need a window. If telemetry_path is given the
+    game is timed and the results are saved there, and if event_sink is given
+    it is sent the game's events. If record_dir is given the game is saved
+    there as a replay when it ends or is interrupted.
+    """
+    if seed is None:
+        seed = random.randrange(2**32)
+    engine = Engine(seed=seed)
+    recorder = Recorder(engine) if record_dir else None
+    if event_sink:
+        EventBus(engine, [event_sink])
+    renderer = renderer_class(engine)
+    telemetry = Telemetry() if telemetry_path else None
+    if telemetry:
+        telemetry.attach_engine(engine)
+        telemetry.instrument(renderer, "render")
+    scheduler = FixedTimestep(engine.get_tick_interval(), MAX_TICKS_PER_FRAME)
+    bot = Bot()
+    try:
+        while not engine.is_game_over():
+            for _ in range(scheduler.advance()):
+                for action in bot(engine) or ():
+                    engine.apply(action)
+                engine.tick()
+            scheduler.tick_interval = engine.get_tick_interval()
+            renderer.render()
+            time.sleep(max(0.0, 1 / FRAMES_PER_SECOND - scheduler.end_frame()))
+        renderer.render()
+    finally:
+        renderer.close()
+        if telemetry:
+            telemetry.dump(telemetry_path, frames=scheduler.stats())
+        if recorder:
+            save_replay(recorder, record_dir)
 
 
 def main():
-    root = tkinter.Tk()
-    Game(root)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="Play Tetris.")
+    parser.add_argument("--seed", type=parse_seed, help="the seed of the first game")
+    parser.add_argument("--record", metavar="DIR", help="save a replay of each game")
+    parser.add_argument(
+        "--telemetry", metavar="FILE", help="time the game and save the results"
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=("tk",) + tuple(HEADLESS_RENDERERS),
+        default="tk",
+        help="draw in a window, or watch the bot play in the terminal or unseen",
+    )
+    parser.add_argument(
+        "--events",
+        metavar="FILE",
+        help="log game events to FILE, as JSON lines if it ends in .jsonl",
+    )
+    args = parser.parse_args()
+
+    event_sink = None
+    if args.events:
+        event_sink = FileSink(args.events, binary=not args.events.endswith(".jsonl"))
+    try:
+        if args.renderer in HEADLESS_RENDERERS:
+            try:
+                watch_bot(
+                    HEADLESS_RENDERERS[args.renderer],
+                    args.seed,
+                    args.record,
+                    args.telemetry,
+                    event_sink,
+                )
+            except KeyboardInterrupt:
+                pass
+            return
+
+        import tkinter
+
+        telemetry = Telemetry() if args.telemetry else None
+        root = tkinter.Tk()
+        game = Game(root, args.seed, args.record, telemetry, event_sink)
+        try:
+            root.mainloop()
+        finally:
+            if telemetry:
+                telemetry.dump(args.telemetry, frames=game.scheduler.stats())
+    finally:
+        if event_sink:
+            event_sink.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,316 @@
+import argparse
+import json
+import math
+import os
+import statistics
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from typing import NamedTuple
+
+from bot import DEFAULT_WEIGHTS, Bot, Weights, evaluate_board
+from engine import X_TILES, Y_TILES
+from replay import parse_seed
+from simulate import GameResult, play_game
+
+GAMES = 20  # The number of seeds every candidate plays by default
+MAX_TICKS = 5_000  # The ticks after which a game is stopped, as good bots never lose
+Z_SCORE = 1.96  # The number of standard errors in a 95% confidence interval
+MIN_GAMES = 5  # The games a candidate plays before it can be stopped early
+JOBS_PER_WORKER = 2  # The games handed to the pool ahead of each worker
+METRICS = ("score", "lines", "pieces", "ticks")
+
+
+class Candidate(NamedTuple):
+    name: str
+    weights: Weights
+
+
+class Standing:
+    """
+    The results of one candidate so far, by seed.
+    """
+
+    def __init__(self, candidate: Candidate):
+        self.candidate = candidate
+        self.results = {}
+        self.stopped_by = None  # The candidate it was found to be worse than
+
+    def values(self, metric: str) -> list[float]:
+        return [getattr(result, metric) for result in self.results.values()]
+
+
+def get_interval(values: list[float]) -> tuple[float, float]:
+    """
+    Returns the mean of values and the half width of its confidence interval,
+    which is infinite until there are two values.
+    """
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, math.inf
+    return mean, Z_SCORE * statistics.stdev(values) / math.sqrt(len(values))
+
+
+def make_candidate(entry: dict) -> Candidate:
+    """
+    Builds a candidate from a name and any of the fields of Weights, with
+    the ones left out at their defaults.
+    """
+    entry = dict(entry)
+    name = entry.pop("name")
+    unknown = set(entry) - set(Weights._fields)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {name}: {', '.join(sorted(unknown))}")
+    weights = DEFAULT_WEIGHTS._replace(
+        **{field: entry[field] for field in Weights._fields if field in entry}
+    )
+    return Candidate(name, weights)
+
+
+def load_candidates(path: str) -> list[Candidate]:
+    """
+    Reads a JSON list of candidates, such as
+    [{"name": "default"}, {"name": "flat", "bumpiness": -0.3}].
+    """
+    with open(path) as f:
+        candidates = [make_candidate(entry) for entry in json.load(f)]
+    names = [candidate.name for candidate in candidates]
+    if len(set(names)) != len(names):
+        raise ValueError("Candidate names must be unique")
+    return candidates
+
+
+def play_match(
+    candidate: Candidate,
+    seed: int,
+    lookahead: int = 0,
+    max_ticks: int = MAX_TICKS,
+    width: int = X_TILES,
+    height: int = Y_TILES,
+) -> tuple[str, GameResult]:
+    """
+    Plays one game of a candidate. The bot searches without a time budget, so
+    that the result only depends on the candidate and the seed.
+    """
+    bot = Bot(
+        partial(evaluate_board, weights=candidate.weights),
+        lookahead=lookahead,
+        time_budget=math.inf,
+    )
+    return candidate.name, play_game(seed, bot, max_ticks, width, height)
+
+
+def play_match_star(args: tuple) -> tuple[str, GameResult]:
+    return play_match(*args)
+
+
+class Tournament:
+    """
+    Plays every candidate on the same seeds and compares them on one of
+    METRICS. Since the seeds are shared, candidates are compared game by
+    game: once two candidates have both played at least min_games of the
+    same seeds, the one whose confidence interval of the differences lies
+    entirely below 0 is stopped, and its remaining games are not played.
+    """
+
+    def __init__(
+        self,
+        candidates: list[Candidate],
+        seeds: list[int],
+        metric: str = "score",
+        min_games: int = MIN_GAMES,
+        report=print,
+    ):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric!r}")
+        self.seeds = list(seeds)
+        self.metric = metric
+        self.min_games = min_games
+        self.report = report
+        self.standings = {
+            candidate.name: Standing(candidate) for candidate in candidates
+        }
+
+    def is_active(self, name: str) -> bool:
+        return self.standings[name].stopped_by is None
+
+    def compare(self, name: str, other: str) -> tuple[int, float, float]:
+        """
+        Returns the number of seeds both candidates played, and the mean and
+        confidence interval of how much better name did than other on them.
+        """
+        results = self.standings[name].results
+        other_results = self.standings[other].results
+        differences = [
+            getattr(results[seed], self.metric)
+            - getattr(other_results[seed], self.metric)
+            for seed in results.keys() & other_results.keys()
+        ]
+        if not differences:
+            return 0, 0.0, math.inf
+        return len(differences), *get_interval(differences)
+
+    def add_result(self, name: str, result: GameResult) -> None:
+        """
+        Records a game and stops the candidates that are now clearly worse
+        than the leader, the active candidate with the best mean.
+        """
+        standing = self.standings[name]
+        standing.results[result.seed] = result
+        mean, interval = get_interval(standing.values(self.metric))
+        self.report(
+            f"{name} seed {result.seed}: {self.metric} {getattr(result, self.metric)}"
+            f" (mean {mean:.1f} ± {interval:.1f} over {len(standing.results)})"
+        )
+
+        active = [other for other in self.standings if self.is_active(other)]
+        leader = max(
+            active,
+            key=lambda other: statistics.fmean(
+                self.standings[other].values(self.metric) or [-math.inf]
+            ),
+        )
+        for other in active:
+            if other == leader:
+                continue
+            games, mean, interval = self.compare(other, leader)
+            if games >= self.min_games and mean + interval < 0:
+                self.standings[other].stopped_by = leader
+                self.report(
+                    f"stopped {other}: {-mean:.1f} ± {interval:.1f} {self.metric} "
+                    f"worse than {leader} over {games} seeds"
+                )
+
+    def summary(self) -> list[str]:
+        """
+        Returns one line per candidate, best mean first.
+        """
+        lines = []
+        for name, standing in sorted(
+            self.standings.items(),
+            key=lambda item: -get_interval(item[1].values(self.metric) or [0])[0],
+        ):
+            if not standing.results:
+                lines.append(f"{name}: no games")
+                continue
+            mean, interval = get_interval(standing.values(self.metric))
+            line = (
+                f"{name}: {self.metric} {mean:.1f} ± {interval:.1f} "
+                f"over {len(standing.results)} games"
+            )
+            if standing.stopped_by is not None:
+                line += f", stopped as worse than {standing.stopped_by}"
+            lines.append(line)
+        return lines
+
+    def as_dict(self) -> dict:
+        candidates = []
+        for name, standing in self.standings.items():
+            values = standing.values(self.metric)
+            mean, interval = get_interval(values) if values else (None, None)
+            candidates.append(
+                {
+                    "name": name,
+                    "weights": standing.candidate.weights._asdict(),
+                    "games": len(values),
+                    "mean": mean,
+                    # JSON has no infinity, so an interval of one game is None
+                    "interval": interval if interval != math.inf else None,
+                    "stopped_by": standing.stopped_by,
+                    "results": [
+                        result._asdict()
+                        for _, result in sorted(standing.results.items())
+                    ],
+                }
+            )
+        return {"metric": self.metric, "seeds": self.seeds, "candidates": candidates}
+
+    def run(
+        self,
+        processes: int | None = None,
+        lookahead: int = 0,
+        max_ticks: int = MAX_TICKS,
+        width: int = X_TILES,
+        height: int = Y_TILES,
+    ) -> None:
+        """
+        Plays the games across a pool of worker processes, one per core
+        unless processes is given. Games are handed out one at a time, seed by
+        seed, to whichever worker is free, with only a few waiting per worker,
+        so that long games do not hold up the rest and the games of stopped
+        candidates are dropped before they are handed out.
+        """
+        jobs = deque(
+            (standing.candidate, seed, lookahead, max_ticks, width, height)
+            for seed in self.seeds
+            for standing in self.standings.values()
+        )
+        if processes == 1:
+            while jobs:
+                job = jobs.popleft()
+                if self.is_active(job[0].name):
+                    self.add_result(*play_match_star(job))
+            return
+        with ProcessPoolExecutor(processes) as pool:
+            window = JOBS_PER_WORKER * (processes or os.cpu_count())
+            running = set()
+            while jobs or running:
+                while jobs and len(running) < window:
+                    job = jobs.popleft()
+                    if self.is_active(job[0].name):
+                        running.add(pool.submit(play_match_star, job))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, result = future.result()
+                    if self.is_active(name):
+                        self.add_result(name, result)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare bot evaluator weights on the same seeds."
+    )
+    parser.add_argument(
+        "candidates",
+        help='a JSON list of candidates, e.g. [{"name": "a", "holes": -0.5}]',
+    )
+    parser.add_argument("--games", type=int, default=GAMES, help="seeds per candidate")
+    parser.add_argument("--seed", type=parse_seed, default=0, help="the first seed")
+    parser.add_argument("--metric", choices=METRICS, default="score")
+    parser.add_argument("--processes", type=int, help="the number of workers")
+    parser.add_argument(
+        "--lookahead", type=int, default=0, help="queued shapes the bot searches"
+    )
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument(
+        "--min-games",
+        type=int,
+        default=MIN_GAMES,
+        help="games before a candidate can be stopped early",
+    )
+    parser.add_argument("--width", type=int, default=X_TILES)
+    parser.add_argument("--height", type=int, default=Y_TILES)
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    args = parser.parse_args()
+
+    tournament = Tournament(
+        load_candidates(args.candidates),
+        range(args.seed, args.seed + args.games),
+        args.metric,
+        args.min_games,
+    )
+    tournament.run(
+        args.processes, args.lookahead, args.max_ticks, args.width, args.height
+    )
+    print()
+    for line in tournament.summary():
+        print(line)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(tournament.as_dict(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
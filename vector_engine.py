@@ -0,0 +1,238 @@
+import numpy as np
+
+from engine import (
+    HARD_DROP_POINTS,
+    KICKS,
+    ORIENTATIONS,
+    QUEUE_LENGTH,
+    SHAPES,
+    SOFT_DROP_POINTS,
+    X_TILES,
+    Y_TILES,
+)
+
+# Action codes accepted by VectorEngine.step
+NOTHING = 0
+LEFT = 1
+RIGHT = 2
+ROTATE = 3
+DOWN = 4
+DROP = 5
+
+# The tiles of every shape in every orientation as [shape, orientation, tile, (x, y)]
+OFFSETS = np.array(ORIENTATIONS, dtype=np.int16)
+
+
+class VectorEngine:
+    """
+    Runs many games in lockstep by storing every board in one array and
+    applying each rule to all of the boards at once with NumPy.
+
+    boards holds a (num_boards, height, width) array where 0 is an empty tile
+    and any other value is one more than the shape the tile came from. The
+    active shape of each board is stored as its shape, orientation and the x
+    and y of the tile it spawned at, so its tiles are OFFSETS moved by (x, y).
+
+    Each step applies one action per board followed by one step of gravity.
+    Unlike Engine, rows are cleared and the blocks above them fall as soon as
+    a shape locks, and the next shape spawns within the same step.
+    """
+
+    def __init__(
+        self,
+        num_boards: int,
+        width: int = X_TILES,
+        height: int = Y_TILES,
+        seed: int | None = None,
+    ):
+        self.num_boards = num_boards
+        self.width = width
+        self.height = height
+        self.center = width // 2 - 1
+        self.random = np.random.default_rng(seed)
+
+        self.boards = np.zeros((num_boards, height, width), dtype=np.uint8)
+        self.shape = np.zeros(num_boards, dtype=np.int16)
+        self.orientation = np.zeros(num_boards, dtype=np.int16)
+        self.x = np.zeros(num_boards, dtype=np.int16)
+        self.y = np.zeros(num_boards, dtype=np.int16)
+        self.queue = np.zeros((num_boards, QUEUE_LENGTH), dtype=np.int16)
+        self.score = np.zeros(num_boards, dtype=np.int64)
+        self.lines = np.zeros(num_boards, dtype=np.int64)
+        self.pieces = np.zeros(num_boards, dtype=np.int64)
+        self.ticks = np.zeros(num_boards, dtype=np.int64)
+        self.game_over = np.zeros(num_boards, dtype=bool)
+        self.reset()
+
+    def reset(self, indices=None) -> None:
+        """
+        Starts new games on the boards at the given indices, or on every board.
+        """
+        if indices is None:
+            indices = np.arange(self.num_boards)
+        indices = np.asarray(indices)
+        self.boards[indices] = 0
+        self.score[indices] = 0
+        self.lines[indices] = 0
+        self.pieces[indices] = 0
+        self.ticks[indices] = 0
+        self.game_over[indices] = False
+        self.queue[indices] = self.random.integers(
+            0, len(SHAPES), (len(indices), QUEUE_LENGTH)
+        )
+        self.spawn_shapes(indices)
+
+    def tiles(self, indices, dx=0, dy=0, rotation=0) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the x and y of each tile of the active shapes on the given
+        boards as (len(indices), 4) arrays, after moving them by (dx, dy) and
+        rotating them by the given number of quarter turns.
+        """
+        offsets = OFFSETS[
+            self.shape[indices], (self.orientation[indices] + rotation) % 4
+        ]
+        xs = offsets[:, :, 0] + (self.x[indices] + dx)[:, None]
+        ys = offsets[:, :, 1] + (self.y[indices] + dy)[:, None]
+        return xs, ys
+
+    def fits(self, indices, dx=0, dy=0, rotation=0) -> np.ndarray:
+        """
+        Checks for each of the given boards if its active shape, moved and
+        rotated as in tiles, is inside the board and clear of inactive blocks.
+        """
+        xs, ys = self.tiles(indices, dx, dy, rotation)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        xs = np.clip(xs, 0, self.width - 1)
+        ys = np.clip(ys, 0, self.height - 1)
+        free = self.boards[np.asarray(indices)[:, None], ys, xs] == 0
+        return (inside & free).all(axis=1)
+
+    def get_filled_rows(self) -> np.ndarray:
+        """
+        Returns a (num_boards, height) array that is True for every full row.
+        """
+        return (self.boards != 0).all(axis=2)
+
+    def step(self, actions) -> None:
+        """
+        Applies one action code per board, then one step of gravity. Boards
+        whose game is over are left unchanged.
+        """
+        actions = np.asarray(actions)
+        alive = ~self.game_over
+        self.ticks[alive] += 1
+
+        for code, dx in ((LEFT, -1), (RIGHT, 1)):
+            indices = np.flatnonzero(alive & (actions == code))
+            moved = indices[self.fits(indices, dx=dx)]
+            self.x[moved] += dx
+
+        pending = np.flatnonzero(alive & (actions == ROTATE))
+        for kick in KICKS:
+            rotated = pending[self.fits(pending, dx=kick, rotation=1)]
+            self.orientation[rotated] = (self.orientation[rotated] + 1) % 4
+            self.x[rotated] += kick
+            pending = np.setdiff1d(pending, rotated, assume_unique=True)
+
+        locking = np.zeros(self.num_boards, dtype=bool)
+
+        indices = np.flatnonzero(alive & (actions == DOWN))
+        self.score[indices] += SOFT_DROP_POINTS
+        falls = self.fits(indices, dy=1)
+        self.y[indices[falls]] += 1
+        locking[indices[~falls]] = True
+
+        indices = np.flatnonzero(alive & (actions == DROP))
+        distance = np.zeros(len(indices), dtype=np.int64)
+        falling = np.ones(len(indices), dtype=bool)
+        while falling.any():
+            falling[falling] = self.fits(indices[falling], dy=distance[falling] + 1)
+            distance[falling] += 1
+        self.y[indices] += distance.astype(np.int16)
+        self.score[indices] += distance * distance * HARD_DROP_POINTS
+        locking[indices] = True
+
+        # Gravity for every shape that was not already locked this step
+        indices = np.flatnonzero(alive & ~locking)
+        falls = self.fits(indices, dy=1)
+        self.y[indices[falls]] += 1
+        locking[indices[~falls]] = True
+
+        indices = np.flatnonzero(locking)
+        if len(indices) > 0:
+            self.lock_shapes(indices)
+            self.clear_rows(indices)
+            self.spawn_shapes(indices)
+
+    def lock_shapes(self, indices) -> None:
+        """
+        Turns the active shapes of the given boards into inactive blocks.
+        """
+        xs, ys = self.tiles(indices)
+        self.boards[indices[:, None], ys, xs] = (self.shape[indices] + 1)[:, None]
+
+    def clear_rows(self, indices) -> None:
+        """
+        Deletes the full rows of the given boards. As in Engine, the blocks
+        above the lowest deleted row fall as connected clusters until each one
+        lands, and rows filled by the falling clusters are deleted in turn.
+        """
+        boards = self.boards[indices]
+        rows = np.arange(self.height)[None, :, None]
+        while True:
+            filled = (boards != 0).all(axis=2)
+            cleared = filled.any(axis=1)
+            if not cleared.any():
+                break
+            self.lines[indices] += filled.sum(axis=1)
+            lowest = np.where(
+                cleared, self.height - 1 - np.argmax(filled[:, ::-1], axis=1), -1
+            )
+            boards[filled] = 0
+            above = rows < lowest[:, None, None]
+            falling = np.where(above, boards, 0)
+            settled = np.where(above, 0, boards)
+            while falling.any():
+                landed = self.find_landed(falling != 0, settled != 0)
+                settled = np.where(landed, falling, settled)
+                falling = np.where(landed, 0, falling)
+                falling[:, 1:] = falling[:, :-1].copy()
+                falling[:, 0] = 0
+            boards = settled
+        self.boards[indices] = boards
+
+    @staticmethod
+    def find_landed(falling: np.ndarray, settled: np.ndarray) -> np.ndarray:
+        """
+        Returns the falling tiles that rest on the floor or a settled tile,
+        together with every falling tile connected to them.
+        """
+        supported = np.zeros_like(falling)
+        supported[:, :-1] = settled[:, 1:]
+        supported[:, -1] = True
+        landed = falling & supported
+        while True:
+            grown = landed.copy()
+            grown[:, 1:] |= landed[:, :-1]
+            grown[:, :-1] |= landed[:, 1:]
+            grown[:, :, 1:] |= landed[:, :, :-1]
+            grown[:, :, :-1] |= landed[:, :, 1:]
+            grown &= falling
+            if np.array_equal(grown, landed):
+                return landed
+            landed = grown
+
+    def spawn_shapes(self, indices) -> None:
+        """
+        Spawns the next shape in the queue of each of the given boards and ends
+        the game on boards where it does not fit.
+        """
+        indices = np.asarray(indices)
+        self.shape[indices] = self.queue[indices, 0]
+        self.queue[indices, :-1] = self.queue[indices, 1:]
+        self.queue[indices, -1] = self.random.integers(0, len(SHAPES), len(indices))
+        self.orientation[indices] = 0
+        self.x[indices] = self.center
+        self.y[indices] = 0
+        self.pieces[indices] += 1
+        self.game_over[indices] |= ~self.fits(indices)